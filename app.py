@@ -1,26 +1,538 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 import sqlite3
+import copy
+import gzip
+import hashlib
 import json
+import logging
+import numpy as np
 import pandas as pd
 import os
+import queue
+import random
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, wraps
 from datetime import datetime, timedelta
 from pathlib import Path
+from types import MappingProxyType
+import yfinance as yf
 from scripts.multi_broker_parser import MultiBrokerPortfolioParser
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
+
+# Cache lifetimes matched to how often each resource actually changes upstream
+CACHE_TTL_FOREX = 300  # Forex quotes update roughly every 15 minutes
+CACHE_TTL_STOCK = 60  # Stock prices move intraday
+CACHE_TTL_PRICE_MISS = 300  # Symbols Yahoo has no price for (delisted, renamed) are rarely fixed within minutes
+CACHE_TTL_LOOKUPS = 300  # Dropdown lookups only change when statements are ingested
+CACHE_TTL_SUMMARY = 60  # Summaries embed unrealized P&L, so they follow the stock price TTL
+# How long a fetched price stays reusable from the database across restarts (default 15 minutes)
+CACHE_TTL_PRICE_PERSISTED = int(os.environ.get('PRICE_CACHE_TTL', '900'))
+
+TRANSACTION_STREAM_BATCH = 500  # Rows fetched per cursor round and serialized per response chunk
+
+# gzip for JSON responses; small bodies are not worth the CPU or the header
+COMPRESS_LEVEL = 4
+COMPRESS_MIN_SIZE = 1024
+
+# Display names used by the statement parser/UI mapped to the short broker codes (read-only)
+BROKER_FULL_TO_SHORT = MappingProxyType({
+    '國泰證券': 'CATHAY',
+    'Charles Schwab': 'SCHWAB',
+    'TD Ameritrade': 'TDA'
+})
+BROKER_SHORT_TO_FULL = MappingProxyType({v: k for k, v in BROKER_FULL_TO_SHORT.items()})
+
+# Account currency per short broker code; brokers not listed trade in USD
+BROKER_CURRENCY = MappingProxyType({'CATHAY': 'TWD'})
+
+# SQL expression deriving transactions.broker_normalized (the short code) from transactions.broker
+BROKER_NORMALIZED_SQL = "CASE broker {} ELSE broker END".format(
+    ' '.join(f"WHEN '{full}' THEN '{short}'" for full, short in BROKER_FULL_TO_SHORT.items())
+)
+
+# (table, column, definition) added to databases created before the column existed
+MIGRATION_COLUMNS = (
+    ('accounts', 'currency', "TEXT DEFAULT 'USD'"),
+    ('accounts', 'user', 'TEXT'),
+    ('transactions', 'currency', "TEXT DEFAULT 'USD'"),
+    ('transactions', 'chinese_name', 'TEXT'),
+    ('transactions', 'user', 'TEXT'),
+    ('transactions', 'broker_normalized', 'TEXT'),
+    ('positions', 'currency', "TEXT DEFAULT 'USD'"),
+    ('positions', 'chinese_name', 'TEXT'),
+)
+
+# Transaction types whose Category/Action does not depend on symbol or amount, resolved with one dict lookup
+TRANSACTION_CATEGORY_ACTION = {
+    **dict.fromkeys(['買進', '現買', 'BUY', 'Buy'], ('Buy', 'Securities Purchased')),
+    **dict.fromkeys(['賣出', '現賣', 'SELL', 'Sale', 'Sell'], ('Sell', 'Securities Sold')),
+    **dict.fromkeys(['SPLIT', 'Split'], ('Investment', 'Stock Split')),
+    **dict.fromkeys(['Interest', 'INTEREST'], ('Interest', 'Credit')),
+    **dict.fromkeys(['Dividend', 'DIVIDEND'], ('Dividend', 'Income')),
+}
+
+# Taiwan stocks - Chinese names (comprehensive mapping), read-only since it is shared module state
+TAIWAN_NAME_TO_YAHOO = MappingProxyType({
+    '台積電': '2330.TW',     # TSMC
+    '聯發科': '2454.TW',     # MediaTek
+    '鴻海': '2317.TW',       # Foxconn/Hon Hai
+    '中鋼': '2002.TW',       # China Steel
+    '富邦台50': '006208.TW', # Fubon Taiwan 50 ETF
+    '台塑': '1301.TW',       # Formosa Plastics
+    '台化': '1326.TW',       # Formosa Chemicals
+    '中華電': '2412.TW',     # Chunghwa Telecom
+    '台達電': '2308.TW',     # Delta Electronics
+    '國泰金': '2882.TW',     # Cathay Financial
+    '玉山金': '2884.TW',     # E.SUN Financial
+    '兆豐金': '2886.TW',     # Mega Financial
+    '富邦金': '2881.TW',     # Fubon Financial
+    '元大台灣50': '0050.TW', # Yuanta Taiwan 50 ETF (alternative name)
+    '台泥': '1101.TW',       # Taiwan Cement
+    '遠傳': '4904.TW',       # Far EasTone
+    '中信金': '2891.TW',     # CTBC Financial
+    '永豐金': '2890.TW',     # SinoPac Financial
+    '南亞': '1303.TW',       # Nan Ya Plastics
+    '華碩': '2357.TW',       # ASUSTek
+    '廣達': '2382.TW',       # Quanta Computer
+    '仁寶': '2324.TW',       # Compal Electronics
+    '和碩': '4938.TW',       # Pegatron
+    '英業達': '2356.TW',     # Inventec
+    '宏碁': '2353.TW',       # Acer
+    '緯創': '3231.TW',       # Wistron
+    '光寶科': '2301.TW',     # Lite-On Technology
+    '統一': '1216.TW',       # Uni-President
+    '味全': '1201.TW',       # Wei Chuan Foods
+    '長榮': '2603.TW',       # Evergreen Marine
+    '陽明': '2609.TW',       # Yang Ming Marine
+    '萬海': '2615.TW'        # Wan Hai Lines
+})
+
+# Bump when _migrate_currency_columns gains a new step
+SCHEMA_VERSION = 7
+
+class TTLCache:
+    """Dict-like cache with a per-entry TTL that evicts the least frequently used entry when full"""
+    
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = {}  # key -> [value, expires_at, hits]
+        self._lock = threading.Lock()
+    
+    def _purge_expired(self, now):
+        """Drop expired entries (caller holds the lock)"""
+        for key in [k for k, entry in self._entries.items() if entry[1] <= now]:
+            del self._entries[key]
+    
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return False
+            return True
+    
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return default
+            entry[2] += 1
+            return entry[0]
+    
+    def __getitem__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                raise KeyError(key)
+            entry[2] += 1
+            return entry[0]
+    
+    def __setitem__(self, key, value):
+        with self._lock:
+            now = time.monotonic()
+            if key not in self._entries and len(self._entries) >= self.maxsize:
+                self._purge_expired(now)
+                if len(self._entries) >= self.maxsize:
+                    # Evict the least frequently used entry, oldest first on ties
+                    victim = min(self._entries, key=lambda k: (self._entries[k][2], self._entries[k][1]))
+                    del self._entries[victim]
+            hits = self._entries[key][2] if key in self._entries else 0
+            self._entries[key] = [value, now + self.ttl, hits]
+    
+    def __len__(self):
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            return len(self._entries)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class YahooRateLimiter:
+    """Adaptive token bucket for Yahoo Finance requests, shared by every PortfolioAPI instance in the process"""
+    
+    def __init__(self, capacity=50, initial_rate=50 / 3600, max_rate=1.0, min_rate=1 / 600,
+                 min_increment=1 / 3600, alpha=0.1, beta=0.5, max_wait=5.0):
+        # The refill rate grows on every successful response and backs off multiplicatively on 429
+        self.capacity = capacity
+        self.rate = initial_rate  # tokens per second (starts at ~50 requests/hour)
+        self.max_rate = max_rate  # Never exceed 1 request/second
+        self.min_rate = min_rate  # σ: at worst one request every 10 minutes
+        self.min_increment = min_increment  # δ: smallest additive increase per success
+        self.alpha = alpha  # α: proportional increase per success
+        self.beta = beta  # β: multiplicative decrease on rate limiting
+        self.max_wait = max_wait  # Longest we block a worker waiting for a token
+        self.tokens = float(capacity)
+        self.available = True  # False while backing off after a 429
+        self.request_count = 0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        """Refill tokens for the time elapsed since the last refill (caller holds the lock)"""
+        # Monotonic clock so NTP adjustments can't drain or overfill the bucket
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+    
+    def acquire(self):
+        """Take a token for a Yahoo Finance request, returns False if none will be available soon"""
+        with self._lock:
+            self._refill()
+            delay = (1 - self.tokens) / self.rate if self.tokens < 1 else 0
+            if delay > self.max_wait:
+                logger.warning("Rate limiting: no token available for %.1fs, skipping Yahoo Finance request", delay)
+                return False
+            # Reserve the token now so concurrent callers queue behind us, then wait outside the lock
+            self.tokens -= 1
+            self.request_count += 1
+            request_number = self.request_count
+        
+        if delay > 0:
+            logger.info("Rate limiting: sleeping for %.1fs (request #%d)", delay, request_number)
+            time.sleep(delay)
+        return True
+    
+    def record_success(self):
+        """Increase the request rate after a successful Yahoo Finance response"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + max(self.min_increment, self.alpha * self.rate))
+            self.available = True
+    
+    def record_rate_limited(self):
+        """Back off the request rate and drain the bucket after Yahoo Finance rate limits us"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.beta * self.rate)
+            self.tokens = 0.0
+            self.available = False
+    
+    def is_available(self):
+        """Check availability without a probe request"""
+        with self._lock:
+            # After a 429 the bucket is drained; Yahoo is considered available again once a token has refilled
+            if not self.available:
+                self._refill()
+                self.available = self.tokens >= 1
+            return self.available
+    
+    def status(self):
+        """Snapshot of the limiter state for the system status endpoint"""
+        with self._lock:
+            self._refill()
+            return {
+                'request_count': self.request_count,
+                'tokens_available': self.tokens,
+                'token_capacity': self.capacity,
+                'request_rate_per_hour': self.rate * 3600,
+                'yahoo_finance_available': self.available
+            }
+
+# One limiter per process so that per-request PortfolioAPI instances can't each start with a full bucket
+yahoo_rate_limiter = YahooRateLimiter()
+
+class SQLiteConnectionPool:
+    """Pool of reusable SQLite connections with read-friendly PRAGMAs applied once per connection"""
+    
+    def __init__(self, db_path, size=8):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue(maxsize=size)
+        # Read-only connection whose PRAGMA data_version moves whenever any other connection commits
+        self._monitor = None
+        self._monitor_lock = threading.Lock()
+        self._statement_signature = (None, None)
+    
+    def _connect(self):
+        # Room for every filter shape in the per-connection prepared statement cache (default 128)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, avoids an fsync per commit
+        conn.execute("PRAGMA mmap_size=268435456")  # 256MB memory-mapped reads
+        conn.execute("PRAGMA cache_size=-65536")  # 64MB page cache
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
+    def statement_signature(self):
+        """Row counts and highest rowids of the statement tables, recounted only after a commit"""
+        with self._monitor_lock:
+            if self._monitor is None:
+                self._monitor = sqlite3.connect(self.db_path, check_same_thread=False)
+            # A PRAGMA read per call; the counts (which cache_kv writes leave unchanged) only run after commits
+            version = self._monitor.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._statement_signature[0]:
+                counts = self._monitor.execute("""
+                    SELECT (SELECT MAX(id) FROM transactions), (SELECT COUNT(*) FROM transactions),
+                           (SELECT MAX(rowid) FROM accounts), (SELECT COUNT(*) FROM accounts)
+                """).fetchone()
+                self._statement_signature = (version, counts)
+            return self._statement_signature[1]
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, committing (or rolling back on error) before returning it to the pool"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        
+        try:
+            with conn:
+                yield conn
+        finally:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+def get_connection_pool(db_path):
+    """Get the process-wide connection pool for a database file"""
+    with _connection_pools_lock:
+        if db_path not in _connection_pools:
+            _connection_pools[db_path] = SQLiteConnectionPool(db_path)
+        return _connection_pools[db_path]
+
+# Yahoo Finance tickers for the forex pairs we can quote; other pairs use the fallback rates
+FOREX_YAHOO_SYMBOLS = MappingProxyType({
+    ('USD', 'TWD'): 'USDTWD=X',
+    ('TWD', 'USD'): 'TWDUSD=X'
+})
+
+# Process-wide forex rate cache; rates do not depend on the database, and several routes
+# build a fresh PortfolioAPI per request, so a per-instance cache would start cold every time
+forex_rate_cache = TTLCache(maxsize=512, ttl=CACHE_TTL_FOREX)
+
+# Process-wide cache for the dropdown lookups, shared by every PortfolioAPI instance
+_lookup_cache = TTLCache(maxsize=32, ttl=CACHE_TTL_LOOKUPS)
+_MISSING = object()
+
+# Bumped by invalidate_lookup_cache() whenever this process writes statements to the database
+_data_generation = 0
+
+def data_version(db_path):
+    """Ingest generation plus row counts and highest rowids of the statement tables; changes whenever
+    any process adds or removes statement rows, but not on price/forex writes to cache_kv"""
+    try:
+        counts = get_connection_pool(db_path).statement_signature()
+    except sqlite3.Error:
+        counts = None
+    return (_data_generation, counts)
+
+def cached_lookup(method):
+    """Memoize a PortfolioAPI lookup per database, data version and arguments in the shared lookup cache"""
+    @wraps(method)
+    def wrapper(self, *args):
+        # The data version also retires entries after writes made outside this process (e.g. the parser scripts);
+        # lists (multi-select filters) are made hashable
+        key = (self.db_path, data_version(self.db_path), method.__name__) + \
+            tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args)
+        result = _lookup_cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = method(self, *args)
+            _lookup_cache[key] = result
+        # Results are shared across requests and threads: tuples of strings (get_symbols, get_users, ...)
+        # are immutable and handed out as they are, anything holding dicts is copied
+        if isinstance(result, tuple) and not (result and isinstance(result[0], dict)):
+            return result
+        return copy.deepcopy(result)
+    return wrapper
+
+# Process-wide cache for portfolio summaries keyed by database and filters
+_summary_cache = TTLCache(maxsize=128, ttl=CACHE_TTL_SUMMARY)
+
+# Process-wide cache for enhanced unrealized P&L keyed by database, filters and base currency
+_unrealized_pnl_cache = TTLCache(maxsize=64, ttl=CACHE_TTL_STOCK)
+
+def invalidate_lookup_cache():
+    """Drop cached lookups, summaries and P&L after new statements have been written to the database"""
+    global _data_generation
+    _data_generation += 1
+    _lookup_cache.clear()
+    _summary_cache.clear()
+    _unrealized_pnl_cache.clear()
+
+def iter_batches(cursor, size=None):
+    """Yield the rows of an executed cursor, fetching cursor.arraysize (or size) rows at a time"""
+    while True:
+        batch = cursor.fetchmany(size or cursor.arraysize)
+        if not batch:
+            return
+        yield from batch
+
+# Yahoo's rate-limit responses as they surface in exception messages, matched in one pass
+RATE_LIMIT_PATTERN = re.compile(r'429|too many requests|rate limit', re.IGNORECASE)
+
+def is_rate_limited_error(error):
+    """Whether an exception from a Yahoo Finance call means we were rate limited (HTTP 429)"""
+    # HTTP errors carry the status directly; only fall back to scanning the message without one
+    status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status_code is not None:
+        return status_code == 429
+    return RATE_LIMIT_PATTERN.search(str(error)) is not None
+
+def last_closes(data, yahoo_symbols):
+    """Last positive close per ticker of a yf.download(group_by='ticker') frame, None when it has none;
+    tickers missing from the frame are left out"""
+    closes = {}
+    if data is None or data.empty:
+        return closes
+    for yahoo_symbol in yahoo_symbols:
+        try:
+            series = data[yahoo_symbol]['Close'] if isinstance(data.columns, pd.MultiIndex) else data['Close']
+            series = series.dropna()
+        except KeyError:
+            continue
+        closes[yahoo_symbol] = series.iloc[-1] if not series.empty and series.iloc[-1] > 0 else None
+    return closes
+
+def split_symbol_info(symbol_info):
+    """Unpack a price request entry, either a bare symbol or a (symbol, broker) tuple"""
+    if isinstance(symbol_info, tuple):
+        return symbol_info
+    return symbol_info, None
+
+def _broker_filter_sql(short_count, composite_count):
+    """SQL condition for a broker filter with short_count broker codes and composite_count BROKER|ACCOUNT keys"""
+    conditions = []
+    if short_count:
+        conditions.append(f"t.broker_normalized IN ({','.join('?' * short_count)})")
+    conditions.extend(["(t.broker_normalized = ? AND t.account_id = ?)"] * composite_count)
+    return ' OR '.join(conditions)
+
+@lru_cache(maxsize=256)
+def _build_tx_filter_sql(shape):
+    """Build the AND-joined WHERE conditions for a PortfolioAPI._build_tx_filter shape"""
+    # Clause order is deliberate: the selective, range-seekable date terms come first,
+    # then symbol/type equality, and the broker terms (which may OR composite keys) last
+    conditions = []
+    for key, *counts in shape:
+        if key == 'year':
+            # Half-open date range instead of strftime() so the transaction_date indexes can be used
+            conditions.append("t.transaction_date >= ? AND t.transaction_date < ?")
+        elif key == 'start_date':
+            conditions.append("t.transaction_date >= ?")
+        elif key == 'end_date':
+            conditions.append("t.transaction_date <= ?")
+        elif key in ('symbol', 'transaction_type'):
+            # A count of 0 is a single scalar value; lists become one IN-list instead of an OR chain
+            if counts[0]:
+                conditions.append(f"t.{key} IN ({','.join('?' * counts[0])})")
+            else:
+                conditions.append(f"t.{key} = ?")
+        elif key == 'broker':
+            conditions.append(f"({_broker_filter_sql(*counts)})")
+    return ' AND '.join(conditions)
+
+@lru_cache(maxsize=256)
+def _build_transactions_query(shape):
+    """Build the get_transactions SQL for a filter shape; only the parameters differ between calls of one shape"""
+    query = """
+            SELECT t.*, a.institution, a.broker as account_broker
+            FROM transactions t
+            JOIN accounts a ON t.account_id = a.account_id
+            WHERE 1=1
+        """
+    for key, *counts in shape:
+        if key == 'account_id':
+            query += " AND t.account_id = ?"
+        elif key == 'broker':
+            query += f" AND ({_broker_filter_sql(*counts)})"
+        elif key == 'symbol':
+            query += f" AND t.symbol IN ({','.join('?' * counts[0])})"
+        elif key == 'symbol_like':
+            query += " AND t.symbol LIKE ?"
+        elif key == 'transaction_type':
+            query += f" AND t.transaction_type IN ({','.join('?' * counts[0])})"
+        elif key == 'user':
+            query += f" AND t.user IN ({','.join('?' * counts[0])})"
+        elif key == 'start_date':
+            query += " AND t.transaction_date >= ?"
+        elif key == 'end_date':
+            query += " AND t.transaction_date <= ?"
+        elif key == 'year':
+            # Half-open date range instead of strftime() so the transaction_date index can be used
+            query += " AND t.transaction_date >= ? AND t.transaction_date < ?"
+    # Served in idx_tx_date_id order, so a LIMIT stops the scan early instead of sorting everything
+    query += " ORDER BY t.transaction_date DESC, t.id DESC"
+    keys = {key for key, *_ in shape}
+    if 'limit' in keys or 'offset' in keys:
+        query += " LIMIT ?" if 'limit' in keys else " LIMIT -1"
+    if 'offset' in keys:
+        query += " OFFSET ?"
+    return query
+
+def realized_pnl_kernel(bought, sold, invested, received, rate):
+    """Realized P&L per position from float64 arrays; returns (cost of sold shares, P&L, P&L in TWD)"""
+    # Cost basis of the sold shares at the average purchase cost; no purchases means no cost basis
+    cost_of_sold_shares = np.where(bought > 0, invested * sold / np.where(bought > 0, bought, 1), 0.0)
+    realized_gain_loss = received - cost_of_sold_shares
+    return cost_of_sold_shares, realized_gain_loss, realized_gain_loss * rate
+
+@lru_cache(maxsize=4096)
+def yahoo_symbol_for(symbol, broker=None):
+    """Enhanced symbol mapping for all exchanges with comprehensive Taiwan stock support (pure, so memoized)"""
+    # Taiwan stocks - numeric codes (4 digits); the length check is the cheaper test, so it goes first
+    if len(symbol) == 4 and symbol.isdigit():
+        return f"{symbol}.TW"
+    
+    # Check Taiwan name mapping first
+    yahoo_symbol = TAIWAN_NAME_TO_YAHOO.get(symbol)
+    if yahoo_symbol is not None:
+        return yahoo_symbol
+    
+    # US stocks - check broker context
+    if broker in ['TDA', 'SCHWAB']:
+        return symbol  # AAPL, MSFT, etc. (no suffix needed)
+    
+    # Hong Kong stocks - .HK suffix
+    if symbol.isdigit() and len(symbol) in [1, 2, 3, 4, 5]:
+        # Could be Hong Kong stock, but need more context
+        pass
+    
+    # Default: return as-is for US stocks or unknown symbols
+    return symbol
 
 class PortfolioAPI:
     def __init__(self, db_path="data/database/portfolio.db"):
         self.db_path = db_path
-        # Add caching for exchange rates and stock prices
-        self._forex_cache = {}
-        self._stock_price_cache = {}
-        self._cache_timestamp = None
-        self._cache_duration = 86400  # 24 hours cache duration (was 30 minutes)
-        self._request_count = 0  # Track API requests for rate limiting
-        self._last_request_time = None
-        self._yahoo_finance_available = True  # Circuit breaker for Yahoo Finance
-        self._last_yahoo_check = None
+        # Add caching for exchange rates and stock prices, each with its own TTL so a
+        # forex refresh no longer throws away warm stock prices
+        self._forex_cache = forex_rate_cache  # Shared across instances and threads
+        self._stock_price_cache = TTLCache(maxsize=4096, ttl=CACHE_TTL_STOCK)
+        # Failed lookups are remembered separately and longer, so dead tickers stop costing a request per minute
+        self._price_miss_cache = TTLCache(maxsize=1024, ttl=CACHE_TTL_PRICE_MISS)
+        self._rate_limiter = yahoo_rate_limiter  # Shared across instances and threads
+        self._pool = get_connection_pool(db_path)  # Shared across instances and threads
         self.ensure_database_exists()
     
     def map_transaction_to_category_action(self, transaction_type, symbol=None, net_amount=None):
@@ -30,32 +542,18 @@ class PortfolioAPI:
         
         transaction_type = str(transaction_type).strip()
         
-        # Handle Chinese transaction types from 國泰證券
-        if transaction_type in ['買進', '現買', 'BUY']:
-            return {'category': 'Buy', 'action': 'Securities Purchased'}
-        elif transaction_type in ['賣出', '現賣', 'SELL']:
-            return {'category': 'Sell', 'action': 'Securities Sold'}
-        
-        # Handle English transaction types from Schwab/TDA  
-        elif transaction_type in ['BUY', 'Buy']:
-            return {'category': 'Buy', 'action': 'Securities Purchased'}
-        elif transaction_type in ['SELL', 'Sale', 'Sell']:
-            return {'category': 'Sell', 'action': 'Securities Sold'}
-        elif transaction_type in ['SPLIT', 'Split']:
-            return {'category': 'Investment', 'action': 'Stock Split'}
-        
-        # Handle other transaction types from statements first
-        elif transaction_type in ['Interest', 'INTEREST']:
-            return {'category': 'Interest', 'action': 'Credit'}
-        elif transaction_type in ['Dividend', 'DIVIDEND']:
-            return {'category': 'Dividend', 'action': 'Income'}
+        # Chinese types from 國泰證券 and English types from Schwab/TDA with a fixed mapping
+        category_action = TRANSACTION_CATEGORY_ACTION.get(transaction_type)
+        if category_action:
+            return {'category': category_action[0], 'action': category_action[1]}
         
         # Handle TAX transactions first (before general deposit/withdrawal logic)
-        elif 'TAX' in transaction_type.upper():
+        upper_type = transaction_type.upper()
+        if 'TAX' in upper_type:
             return {'category': 'Interest', 'action': 'NRA Tax'}
-        elif 'JOURNAL' in transaction_type.upper():
+        elif 'JOURNAL' in upper_type:
             return {'category': 'Withdrawal', 'action': 'Journaled'}
-        elif 'MONEYLINK' in transaction_type.upper():
+        elif 'MONEYLINK' in upper_type:
             return {'category': 'Withdrawal', 'action': 'MoneyLink'}
         
         # Handle OTHER transaction types with more intelligence
@@ -87,6 +585,9 @@ class PortfolioAPI:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
+            # WAL lets readers run concurrently with the statement parser's writes (persists in the DB file)
+            cursor.execute("PRAGMA journal_mode=WAL")
+            
             # Create accounts table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS accounts (
@@ -121,6 +622,7 @@ class PortfolioAPI:
                     description TEXT,
                     currency TEXT DEFAULT 'USD',
                     user TEXT,
+                    broker_normalized TEXT,
                     FOREIGN KEY (account_id) REFERENCES accounts (account_id)
                 )
             """)
@@ -144,92 +646,109 @@ class PortfolioAPI:
                 )
             """)
             
+            # Persisted forex/price quotes so a restarted worker doesn't start cold against Yahoo
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS cache_kv (
+                    key TEXT PRIMARY KEY,
+                    value REAL,
+                    expires_at INTEGER
+                )
+            """)
+            
+            # Indexes for the hot filter/sort columns used by get_transactions, get_symbols and get_brokers
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tx_date_id ON transactions(transaction_date DESC, id DESC)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tx_account_date ON transactions(account_id, transaction_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tx_broker_symbol_date ON transactions(broker, symbol, transaction_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tx_type_date ON transactions(transaction_type, transaction_date)")
+            # (symbol, account_id) covers get_symbols' join, so the unfiltered dropdown is an index-only scan
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tx_symbol_account ON transactions(symbol, account_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_accounts_broker ON accounts(broker, institution)")
+            # Partial index for cash movements
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tx_cash ON transactions(transaction_date) WHERE symbol IS NULL")
+            
             conn.commit()
             
             # Add currency columns to existing tables if they don't exist
             self._migrate_currency_columns(cursor)
     
+    def _column_exists(self, cursor, table, column, table_columns):
+        """Check a column against PRAGMA table_info, caching each table's column set in table_columns"""
+        if table not in table_columns:
+            cursor.execute(f"PRAGMA table_info({table})")
+            table_columns[table] = {row[1] for row in cursor.fetchall()}
+        return column in table_columns[table]
+    
     def _migrate_currency_columns(self, cursor):
         """Add currency, chinese_name, and user columns to existing tables and populate based on broker"""
         try:
-            # Check and add currency column to accounts table
-            cursor.execute("PRAGMA table_info(accounts)")
-            accounts_columns = [row[1] for row in cursor.fetchall()]
-            
-            if 'currency' not in accounts_columns:
-                cursor.execute("ALTER TABLE accounts ADD COLUMN currency TEXT DEFAULT 'USD'")
-                print("Added currency column to accounts table")
-            
-            if 'user' not in accounts_columns:
-                cursor.execute("ALTER TABLE accounts ADD COLUMN user TEXT")
-                print("Added user column to accounts table")
-            
-            # Check and add currency column to transactions table
-            cursor.execute("PRAGMA table_info(transactions)")
-            transactions_columns = [row[1] for row in cursor.fetchall()]
-            
-            if 'currency' not in transactions_columns:
-                cursor.execute("ALTER TABLE transactions ADD COLUMN currency TEXT DEFAULT 'USD'")
-                print("Added currency column to transactions table")
-                
-            # Check and add chinese_name column to transactions table
-            if 'chinese_name' not in transactions_columns:
-                cursor.execute("ALTER TABLE transactions ADD COLUMN chinese_name TEXT")
-                print("Added chinese_name column to transactions table")
-            
-            if 'user' not in transactions_columns:
-                cursor.execute("ALTER TABLE transactions ADD COLUMN user TEXT")
-                print("Added user column to transactions table")
-            
-            # Check and add currency column to positions table
-            cursor.execute("PRAGMA table_info(positions)")
-            positions_columns = [row[1] for row in cursor.fetchall()]
-            
-            if 'currency' not in positions_columns:
-                cursor.execute("ALTER TABLE positions ADD COLUMN currency TEXT DEFAULT 'USD'")
-                print("Added currency column to positions table")
-                
-            # Check and add chinese_name column to positions table
-            if 'chinese_name' not in positions_columns:
-                cursor.execute("ALTER TABLE positions ADD COLUMN chinese_name TEXT")
-                print("Added chinese_name column to positions table")
+            # Skip the whole migration (and its full-table UPDATEs) once it has been applied
+            cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (v INTEGER)")
+            cursor.execute("SELECT MAX(v) FROM schema_version")
+            if (cursor.fetchone()[0] or 0) >= SCHEMA_VERSION:
+                return
+            
+            # Run the column additions and backfill as a single write transaction
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            # Columns added after the original schema, checked against one cached PRAGMA per table
+            table_columns = {}
+            for table, column, definition in MIGRATION_COLUMNS:
+                if not self._column_exists(cursor, table, column, table_columns):
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                    table_columns[table].add(column)
+                    logger.info("Added %s column to %s table", column, table)
             
             # Update existing records with appropriate currency based on broker
-            # CATHAY/國泰證券 → TWD, SCHWAB/TDA → USD
-            cursor.execute("""
-                UPDATE accounts 
-                SET currency = CASE 
-                    WHEN broker LIKE '%CATHAY%' OR broker LIKE '%國泰證券%' THEN 'TWD'
-                    WHEN broker LIKE '%SCHWAB%' OR broker LIKE '%TDA%' THEN 'USD'
-                    ELSE 'USD'
+            # CATHAY/國泰證券 → TWD, SCHWAB/TDA → USD; classified in Python once per distinct broker
+            for table in ('accounts', 'transactions', 'positions'):
+                cursor.execute(f"SELECT DISTINCT broker FROM {table}")
+                updates = [(BROKER_CURRENCY.get(BROKER_FULL_TO_SHORT.get(broker, broker), 'USD'), broker)
+                           for (broker,) in cursor.fetchall()]
+                cursor.executemany(
+                    f"UPDATE {table} SET currency = ? WHERE broker IS ? AND (currency = 'USD' OR currency IS NULL)",
+                    updates
+                )
+            
+            # Short broker code per transaction so broker filters become a single indexed IN (...)
+            cursor.execute(f"UPDATE transactions SET broker_normalized = {BROKER_NORMALIZED_SQL}")
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_tx_broker_normalized
+                AFTER INSERT ON transactions
+                WHEN NEW.broker_normalized IS NULL
+                BEGIN
+                    UPDATE transactions SET broker_normalized = {BROKER_NORMALIZED_SQL} WHERE id = NEW.id;
                 END
-                WHERE currency = 'USD' OR currency IS NULL
             """)
-            
+            # Trailing symbol makes broker-filtered get_symbols index-only as well
             cursor.execute("""
-                UPDATE transactions 
-                SET currency = CASE 
-                    WHEN broker LIKE '%CATHAY%' OR broker LIKE '%國泰證券%' THEN 'TWD'
-                    WHEN broker LIKE '%SCHWAB%' OR broker LIKE '%TDA%' THEN 'USD'
-                    ELSE 'USD'
-                END
-                WHERE currency = 'USD' OR currency IS NULL
+                CREATE INDEX IF NOT EXISTS idx_tx_broker_normalized_symbol
+                ON transactions(broker_normalized, account_id, symbol)
             """)
-            
+            # Grouping order of the realized P&L / holdings aggregates; needs the currency column added above
             cursor.execute("""
-                UPDATE positions 
-                SET currency = CASE 
-                    WHEN broker LIKE '%CATHAY%' OR broker LIKE '%國泰證券%' THEN 'TWD'
-                    WHEN broker LIKE '%SCHWAB%' OR broker LIKE '%TDA%' THEN 'USD'
-                    ELSE 'USD'
-                END
-                WHERE currency = 'USD' OR currency IS NULL
+                CREATE INDEX IF NOT EXISTS idx_tx_cover
+                ON transactions(symbol, broker, currency, transaction_date, transaction_type)
+            """)
+            # Every column the positions/holdings aggregates read, so they run as index-only scans in GROUP BY order
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tx_positions
+                ON transactions(symbol, broker, currency, transaction_type, quantity, net_amount, price)
             """)
             
-            print("Updated existing records with appropriate currency values")
+            # Superseded by wider indexes over the same leading columns
+            for index in ('idx_tx_broker_symbol', 'idx_tx_symbol', 'idx_tx_broker_normalized'):
+                cursor.execute(f"DROP INDEX IF EXISTS {index}")
+            
+            # Refresh planner statistics so the new indexes are actually chosen
+            cursor.execute("ANALYZE")
+            
+            cursor.execute("INSERT INTO schema_version (v) VALUES (?)", (SCHEMA_VERSION,))
+            cursor.connection.commit()
+            logger.info("Updated existing records with appropriate currency values")
             
         except Exception as e:
-            print(f"Migration warning: {e}")
+            cursor.connection.rollback()
+            logger.warning("Migration warning: %s", e)
             # Don't fail if migration has issues
     
     def load_csv_data(self, csv_path):
@@ -240,36 +759,42 @@ class PortfolioAPI:
             success = parser.process_file(Path(csv_path))
             
             if success:
-                print(f"Successfully processed CSV file: {csv_path}")
+                invalidate_lookup_cache()
+                logger.info("Successfully processed CSV file: %s", csv_path)
                 return True
             else:
-                print(f"Failed to process CSV file: {csv_path}")
+                logger.warning("Failed to process CSV file: %s", csv_path)
                 return False
                 
         except Exception as e:
-            print(f"Error loading CSV: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error loading CSV: %s", e)
             return False
     
     def process_all_broker_statements(self):
         """Process all broker statements (CSV and PDF)"""
         try:
             parser = MultiBrokerPortfolioParser(db_path=self.db_path)
-            parser.process_all_statements()
+            try:
+                parser.process_all_statements()
+            finally:
+                # Even a partial run may have written rows
+                invalidate_lookup_cache()
             return True
         except Exception as e:
-            print(f"Error processing broker statements: {e}")
+            logger.warning("Error processing broker statements: %s", e)
             return False
     
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """Borrow a pooled connection, use as `with self.get_connection() as conn:`"""
+        return self._pool.connection()
+    
+    def _query_one(self, query, params=()):
+        """Run a query on its own pooled connection and return its first row"""
+        with self.get_connection() as conn:
+            return conn.execute(query, params).fetchone()
     
     def get_database_info(self):
         """Get database timestamp and basic stats"""
-        import os
-        from datetime import datetime
-        
         if not os.path.exists(self.db_path):
             return None
             
@@ -293,37 +818,32 @@ class PortfolioAPI:
             'account_count': account_count
         }
     
+    @cached_lookup
     def get_accounts(self):
         """Get all accounts with broker info"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute("""
                 SELECT account_id, institution, broker, account_type, account_holder
                 FROM accounts
                 ORDER BY broker, institution, account_id
             """)
-            return [dict(zip([col[0] for col in cursor.description], row)) 
-                   for row in cursor.fetchall()]
+            return tuple(dict(row) for row in cursor)
     
+    @cached_lookup
     def get_brokers(self):
         """Get all unique brokers with account details for multi-account brokers"""
-        # Mapping from short names to full names
-        broker_mapping = {
-            'CATHAY': '國泰證券',
-            'SCHWAB': 'Charles Schwab', 
-            'TDA': 'TD Ameritrade'
-        }
-        
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
-            # Get broker info with account counts to identify multi-account brokers
+            # One row per broker account; the window counts the accounts of each broker after grouping,
+            # so multi-account brokers are identified in SQL rather than by regrouping in Python
             cursor.execute("""
                 SELECT 
                     t.broker, 
                     a.account_id, 
-                    a.institution,
-                    COUNT(*) as transaction_count
+                    COUNT(*) OVER (PARTITION BY t.broker) as accounts_per_broker
                 FROM transactions t
                 JOIN accounts a ON t.account_id = a.account_id
                 WHERE t.broker IS NOT NULL 
@@ -331,33 +851,19 @@ class PortfolioAPI:
                 ORDER BY t.broker, a.account_id
             """)
             
-            broker_accounts = cursor.fetchall()
-            
-            # Group by broker to check for multiple accounts
-            broker_groups = {}
-            for broker, account_id, institution, trans_count in broker_accounts:
-                if broker not in broker_groups:
-                    broker_groups[broker] = []
-                broker_groups[broker].append({
-                    'account_id': account_id,
-                    'institution': institution,
-                    'transaction_count': trans_count
-                })
-            
             # Generate broker entries
             broker_entries = []
-            for broker, accounts in broker_groups.items():
-                full_name = broker_mapping.get(broker, broker)
+            for broker, account_id, accounts_per_broker in cursor:
+                full_name = BROKER_SHORT_TO_FULL.get(broker, broker)
                 
-                if len(accounts) > 1:
+                if accounts_per_broker > 1:
                     # Multi-account broker: show separate entries for each account
-                    for account_info in accounts:
-                        account_display = f"{full_name} ({account_info['account_id'][-4:]})"  # Show last 4 digits
-                        broker_entries.append({
-                            'key': f"{broker}|{account_info['account_id']}",  # Use composite key for filtering
-                            'display': account_display,
-                            'sort_key': f"{full_name}_{account_info['account_id']}"
-                        })
+                    account_display = f"{full_name} ({account_id[-4:]})"  # Show last 4 digits
+                    broker_entries.append({
+                        'key': f"{broker}|{account_id}",  # Use composite key for filtering
+                        'display': account_display,
+                        'sort_key': f"{full_name}_{account_id}"
+                    })
                 else:
                     # Single account broker: show as normal
                     broker_entries.append({
@@ -375,6 +881,7 @@ class PortfolioAPI:
                 'broker_keys': {entry['display']: entry['key'] for entry in broker_entries}
             }
     
+    @cached_lookup
     def get_users(self):
         """Get all unique users from transactions"""
         with self.get_connection() as conn:
@@ -388,131 +895,70 @@ class PortfolioAPI:
                 ORDER BY user
             """)
             
-            users = [row[0] for row in cursor.fetchall() if row[0]]
-            
-            # If no users found, return empty list
-            if not users:
-                return []
-            
-            return users
+            return tuple(row[0] for row in cursor if row[0])
     
+    @cached_lookup
     def get_symbols(self, broker_filters=None):
         """Get all unique symbols, optionally filtered by broker"""
-        # Broker mapping for filtering (same as in get_transactions)
-        broker_mapping = {
-            '國泰證券': 'CATHAY',
-            'Charles Schwab': 'SCHWAB', 
-            'TD Ameritrade': 'TDA'
-        }
-        
         query = """
             SELECT DISTINCT t.symbol 
             FROM transactions t
             JOIN accounts a ON t.account_id = a.account_id
             WHERE t.symbol IS NOT NULL
         """
-        params = []
-        
-        if broker_filters:
-            if isinstance(broker_filters, list):
-                if len(broker_filters) > 0:
-                    # Use the same filtering logic as get_transactions to handle composite keys
-                    broker_conditions, broker_params = self._parse_broker_filter(broker_filters, use_account_join=True)
-                    if broker_conditions:
-                        query += f" AND ({' OR '.join(broker_conditions)})"
-                        params.extend(broker_params)
-            else:
-                # Single broker (backward compatibility)
-                if '|' in broker_filters:
-                    # Composite key: specific account
-                    broker_short, account_id = broker_filters.split('|', 1)
-                    query += " AND (t.broker = ? AND t.account_id = ?)"
-                    params.extend([broker_short, account_id])
-                else:
-                    # Regular broker - check both original name and mapped name
-                    short_name = broker_mapping.get(broker_filters, broker_filters)
-                    query += " AND (t.broker = ? OR t.broker = ? OR a.broker = ? OR a.institution = ?)"
-                    params.extend([broker_filters, short_name, short_name, broker_filters])
+        # Same broker matching (including composite keys) as get_transactions
+        filter_sql, params = self._build_tx_filter({'broker': broker_filters})
+        query += (' AND ' + filter_sql) if filter_sql else ''
         
         query += " ORDER BY t.symbol"
         
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
-            return [row[0] for row in cursor.fetchall()]
+            # Immutable, since the result is shared through the lookup cache
+            return tuple(row[0] for row in cursor)
     
+    @cached_lookup
     def get_currencies(self):
         """Get all unique currencies"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT DISTINCT currency FROM transactions WHERE currency IS NOT NULL ORDER BY currency")
-            return [row[0] for row in cursor.fetchall()]
-    
-    def _is_cache_valid(self):
-        """Check if cache is still valid"""
-        if self._cache_timestamp is None:
-            return False
-        
-        import time
-        return (time.time() - self._cache_timestamp) < self._cache_duration
+            return tuple(row[0] for row in cursor)
     
-    def _throttle_requests(self, is_cached_request=False):
-        """Implement request throttling to avoid rate limits"""
-        # Skip throttling for cached responses
-        if is_cached_request:
-            return
+    @cached_lookup
+    def get_broker_summary(self):
+        """Get account and transaction counts per broker; only changes when statements are ingested"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
             
-        import time
-        
-        current_time = time.time()
-        
-        # Reset counter every hour
-        if self._last_request_time is None or (current_time - self._last_request_time) > 3600:
-            self._request_count = 0
-            self._last_request_time = current_time
-        
-        # If we've made too many requests, add a longer delay
-        if self._request_count > 50:  # Conservative limit
-            delay = min(2.0 + (self._request_count - 50) * 0.1, 5.0)  # Cap at 5 seconds
-            print(f"Rate limiting: sleeping for {delay:.1f}s (request #{self._request_count})")
-            time.sleep(delay)
-        
-        self._request_count += 1
-        self._last_request_time = current_time
+            # Get account summary by broker
+            cursor.execute("""
+                SELECT a.broker, a.institution, COUNT(DISTINCT a.account_id) as account_count,
+                       COUNT(DISTINCT t.id) as transaction_count,
+                       SUM(CASE WHEN t.transaction_type LIKE '%買%' OR t.transaction_type LIKE '%Buy%' THEN 1 ELSE 0 END) as buy_count,
+                       SUM(CASE WHEN t.transaction_type LIKE '%賣%' OR t.transaction_type LIKE '%Sell%' THEN 1 ELSE 0 END) as sell_count,
+                       SUM(t.net_amount) as total_net_amount
+                FROM accounts a
+                LEFT JOIN transactions t ON a.account_id = t.account_id
+                GROUP BY a.broker, a.institution
+                ORDER BY a.broker
+            """)
+            
+            return tuple({
+                'broker': row[0],
+                'institution': row[1],
+                'account_count': row[2],
+                'transaction_count': row[3],
+                'buy_transactions': row[4],
+                'sell_transactions': row[5],
+                'total_net_cash_flow': row[6] or 0,  # Clarified name
+                'net_amount_explanation': 'This represents net cash flow (money in/out), not portfolio performance. Negative values indicate more money spent on purchases than received from sales.'
+            } for row in cursor)
     
     def _check_yahoo_finance_availability(self):
-        """Check if Yahoo Finance is available and implement circuit breaker"""
-        import time
-        
-        current_time = time.time()
-        
-        # Check every 10 minutes
-        if self._last_yahoo_check is None or (current_time - self._last_yahoo_check) > 600:
-            # Try a simple request to check availability
-            try:
-                import yfinance as yf
-                test_ticker = yf.Ticker("AAPL")
-                test_hist = test_ticker.history(period="1d")
-                
-                if not test_hist.empty:
-                    self._yahoo_finance_available = True
-                    print("Yahoo Finance availability check: OK")
-                else:
-                    self._yahoo_finance_available = False
-                    print("Yahoo Finance availability check: No data returned")
-                    
-            except Exception as e:
-                error_msg = str(e).lower()
-                if 'too many requests' in error_msg or '429' in error_msg or 'rate limit' in error_msg:
-                    self._yahoo_finance_available = False
-                    print("Yahoo Finance availability check: Rate limited")
-                else:
-                    self._yahoo_finance_available = False
-                    print(f"Yahoo Finance availability check: Error - {e}")
-            
-            self._last_yahoo_check = current_time
-        
-        return self._yahoo_finance_available
+        """Check if Yahoo Finance is available based on the shared adaptive token bucket (no probe request)"""
+        return self._rate_limiter.is_available()
     
     def get_forex_rate(self, from_currency, to_currency):
         """Get forex rates from Yahoo Finance with caching and rate limiting protection"""
@@ -522,36 +968,20 @@ class PortfolioAPI:
         # Create cache key
         cache_key = f"{from_currency}_{to_currency}"
         
-        # Check cache first
-        if self._is_cache_valid() and cache_key in self._forex_cache:
-            return self._forex_cache[cache_key]
-        
-        # Clear cache if invalid and set new timestamp
-        if not self._is_cache_valid():
-            self._forex_cache.clear()
-            self._stock_price_cache.clear()
-            # Set new cache timestamp immediately to avoid multiple clears
-            import time
-            self._cache_timestamp = time.time()
-        
-        # Yahoo Finance forex symbols
-        forex_mapping = {
-            ('USD', 'TWD'): 'USDTWD=X',
-            ('TWD', 'USD'): 'TWDUSD=X'
-        }
+        # Check cache first, then the copy persisted by this or an earlier process
+        cached_rate = self._forex_cache.get(cache_key)
+        if cached_rate is not None:
+            return cached_rate
+        persisted_rate = self._read_cache_kv([f"forex:{cache_key}"]).get(f"forex:{cache_key}")
+        if persisted_rate is not None:
+            self._forex_cache[cache_key] = persisted_rate
+            return persisted_rate
         
-        forex_symbol = forex_mapping.get((from_currency, to_currency))
+        forex_symbol = FOREX_YAHOO_SYMBOLS.get((from_currency, to_currency))
         rate = None
         
-        if forex_symbol and self._check_yahoo_finance_availability():
+        if forex_symbol and self._check_yahoo_finance_availability() and self._rate_limiter.acquire():
             try:
-                import yfinance as yf
-                import time
-                import random
-                
-                # Apply request throttling only for actual API calls (not cached)
-                self._throttle_requests(is_cached_request=False)
-                
                 ticker = yf.Ticker(forex_symbol)
                 
                 # Try different methods with better error handling
@@ -561,28 +991,42 @@ class PortfolioAPI:
                     if not hist.empty:
                         rate = hist['Close'].iloc[-1]
                 except Exception as hist_error:
-                    print(f"History method failed for {forex_symbol}: {hist_error}")
+                    logger.warning("History method failed for %s: %s", forex_symbol, hist_error)
+                    if is_rate_limited_error(hist_error):
+                        self._rate_limiter.record_rate_limited()
+                        # Only an actual 429 warrants waiting (with jitter) before the fallback
+                        time.sleep(random.uniform(0, 0.5))
                     
                     # Method 2: Try ticker info as fallback
                     try:
-                        time.sleep(random.uniform(0.3, 0.7))
                         info = ticker.info
                         if info and 'regularMarketPrice' in info and info['regularMarketPrice']:
                             rate = info['regularMarketPrice']
                         elif info and 'previousClose' in info and info['previousClose']:
                             rate = info['previousClose']
                     except Exception as info_error:
-                        print(f"Info method failed for {forex_symbol}: {info_error}")
+                        logger.warning("Info method failed for %s: %s", forex_symbol, info_error)
+                        if is_rate_limited_error(info_error):
+                            self._rate_limiter.record_rate_limited()
+                
+                if rate is not None:
+                    self._rate_limiter.record_success()
+                    self._write_cache_kv({f"forex:{cache_key}": rate}, CACHE_TTL_FOREX)
                         
             except Exception as e:
-                error_msg = str(e).lower()
-                if 'too many requests' in error_msg or '429' in error_msg or 'rate limit' in error_msg:
-                    print(f"Rate limited fetching forex rate {from_currency}/{to_currency}, using fallback")
-                    self._yahoo_finance_available = False  # Temporarily disable
+                if is_rate_limited_error(e):
+                    logger.warning("Rate limited fetching forex rate %s/%s, using fallback", from_currency, to_currency)
+                    self._rate_limiter.record_rate_limited()
                 else:
-                    print(f"Error fetching forex rate {from_currency}/{to_currency}: {e}")
+                    logger.warning("Error fetching forex rate %s/%s: %s", from_currency, to_currency, e)
         elif forex_symbol:
-            print(f"Yahoo Finance unavailable, using fallback rate for {from_currency}/{to_currency}")
+            logger.warning("Yahoo Finance unavailable, using fallback rate for %s/%s", from_currency, to_currency)
+        
+        # Prefer the last rate actually quoted by Yahoo, even if expired, over the hardcoded fallback
+        if rate is None:
+            rate = self._read_cache_kv([f"forex:{cache_key}"], include_expired=True).get(f"forex:{cache_key}")
+            if rate is not None:
+                logger.info("Using last known rate for %s/%s: %s", from_currency, to_currency, rate)
         
         # Use fallback rates if Yahoo Finance fails
         if rate is None:
@@ -591,13 +1035,95 @@ class PortfolioAPI:
                 ('TWD', 'USD'): 1/31.5
             }
             rate = fallback_rates.get((from_currency, to_currency), 1.0)
-            print(f"Using fallback rate for {from_currency}/{to_currency}: {rate}")
+            logger.warning("Using fallback rate for %s/%s: %s", from_currency, to_currency, rate)
         
         # Cache the result
         self._forex_cache[cache_key] = rate
         
         return rate
 
+    def _read_cache_kv(self, keys, include_expired=False):
+        """Read persisted cache values; returns {key: value} for the keys found (unexpired unless include_expired)"""
+        if not keys:
+            return {}
+        query = f"SELECT key, value FROM cache_kv WHERE key IN ({','.join('?' * len(keys))})"
+        params = list(keys)
+        if not include_expired:
+            query += " AND expires_at > ?"
+            params.append(int(time.time()))
+        try:
+            with self.get_connection() as conn:
+                return dict(conn.execute(query, params).fetchall())
+        except sqlite3.Error as e:
+            logger.warning("Cache read failed: %s", e)
+            return {}
+    
+    def _write_cache_kv(self, values, ttl):
+        """Persist {key: value} entries that expire ttl seconds from now"""
+        if not values:
+            return
+        expires_at = int(time.time()) + ttl
+        try:
+            with self.get_connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO cache_kv (key, value, expires_at) VALUES (?, ?, ?)",
+                    [(key, float(value), expires_at) for key, value in values.items()]
+                )
+        except sqlite3.Error as e:
+            # Persisting is best effort; the in-memory cache still holds the value
+            logger.warning("Cache write failed: %s", e)
+    
+    def bulk_get_rates(self, pairs, max_workers=5):
+        """Fetch several (from_currency, to_currency) rates concurrently; returns {(from, to): rate}"""
+        pairs = list(dict.fromkeys(pairs))
+        # Quote every uncached pair Yahoo knows in one batched download; get_forex_rate then hits the cache
+        self._bulk_refresh_forex(pairs)
+        if len(pairs) < 2:
+            return {pair: self.get_forex_rate(*pair) for pair in pairs}
+        
+        # Each lookup spends most of its time waiting on Yahoo, so overlap them instead of
+        # paying the round-trips one after another (cache and rate limiter are thread-safe)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pairs))) as executor:
+            rates = executor.map(lambda pair: self.get_forex_rate(*pair), pairs)
+            return dict(zip(pairs, rates))
+    
+    def _bulk_refresh_forex(self, pairs):
+        """Warm the forex cache for all uncached quotable pairs with one batched yf.download request"""
+        pending = {f"{from_currency}_{to_currency}": FOREX_YAHOO_SYMBOLS[(from_currency, to_currency)]
+                   for from_currency, to_currency in pairs
+                   if (from_currency, to_currency) in FOREX_YAHOO_SYMBOLS
+                   and f"{from_currency}_{to_currency}" not in self._forex_cache}
+        
+        # Unexpired rates persisted by this or an earlier process need no request at all
+        persisted = self._read_cache_kv([f"forex:{cache_key}" for cache_key in pending])
+        for cache_key in list(pending):
+            if f"forex:{cache_key}" in persisted:
+                self._forex_cache[cache_key] = persisted[f"forex:{cache_key}"]
+                del pending[cache_key]
+        
+        # Failures are left uncached, so get_forex_rate's own fallbacks still run for them
+        if not pending or not self._check_yahoo_finance_availability() or not self._rate_limiter.acquire():
+            return
+        try:
+            data = yf.download(" ".join(sorted(pending.values())), period="2d", interval="1d",
+                               group_by='ticker', threads=True, progress=False)
+        except Exception as e:
+            if is_rate_limited_error(e):
+                logger.warning("Rate limited on batched forex download, falling back to per-pair fetch")
+                self._rate_limiter.record_rate_limited()
+            else:
+                logger.warning("Batched forex download failed: %s", e)
+            return
+        
+        closes = last_closes(data, pending.values())
+        fetched = {cache_key: closes[forex_symbol] for cache_key, forex_symbol in pending.items()
+                   if closes.get(forex_symbol) is not None}
+        if fetched:
+            self._rate_limiter.record_success()
+            for cache_key, rate in fetched.items():
+                self._forex_cache[cache_key] = rate
+            self._write_cache_kv({f"forex:{cache_key}": rate for cache_key, rate in fetched.items()}, CACHE_TTL_FOREX)
+    
     def convert_to_twd(self, amount, from_currency):
         """Convert amount to TWD using real-time or fallback exchange rate"""
         if amount is None:
@@ -610,499 +1136,361 @@ class PortfolioAPI:
         rate = self.get_forex_rate(from_currency, 'TWD')
         return amount * rate
     
-    def _apply_broker_filter(self, query, params, filters, use_account_join=False):
-        """Apply broker filter with proper handling of name mapping"""
-        if not filters or not filters.get('broker'):
-            return query, params
-            
-        broker_mapping = {
-            '國泰證券': 'CATHAY',
-            'Charles Schwab': 'SCHWAB', 
-            'TD Ameritrade': 'TDA'
-        }
-        
-        broker_filter = filters['broker']
-        if isinstance(broker_filter, list) and len(broker_filter) > 0:
-            broker_conditions, broker_params = self._parse_broker_filter(broker_filter, use_account_join=use_account_join)
-            if broker_conditions:
-                query += f" AND ({' OR '.join(broker_conditions)})"
-                params.extend(broker_params)
-        elif isinstance(broker_filter, str):
-            # Single broker (backward compatibility)
-            if '|' in broker_filter:
-                # Composite key: specific account
-                broker_short, account_id = broker_filter.split('|', 1)
-                query += " AND (t.broker = ? AND t.account_id = ?)"
-                params.extend([broker_short, account_id])
-            else:
-                # Regular broker - check both original name and mapped name
-                short_name = broker_mapping.get(broker_filter, broker_filter)
-                if use_account_join:
-                    query += " AND (t.broker = ? OR t.broker = ? OR a.broker = ? OR a.institution = ?)"
-                    params.extend([broker_filter, short_name, short_name, broker_filter])
-                else:
-                    query += " AND (t.broker = ? OR t.broker = ?)"
-                    params.extend([broker_filter, short_name])
-                    
-        return query, params
-
-    def _parse_broker_filter(self, broker_filter_list, use_account_join=False):
-        """Parse broker filter list that may contain composite keys (BROKER|ACCOUNT_ID)"""
-        broker_conditions = []
-        params = []
-        
-        # Broker mapping for filtering
-        broker_mapping = {
-            '國泰證券': 'CATHAY',
-            'Charles Schwab': 'SCHWAB', 
-            'TD Ameritrade': 'TDA'
-        }
+    def _twd_rate_map(self, currencies):
+        """Map each distinct currency to its TWD rate, fetched concurrently (TWD itself is 1.0)"""
+        rates = self.bulk_get_rates([(currency, 'TWD') for currency in set(currencies) if currency != 'TWD'])
+        rate_by_currency = {from_currency: rate for (from_currency, _), rate in rates.items()}
+        rate_by_currency['TWD'] = 1.0
+        return rate_by_currency
+    
+    def vectorized_to_twd(self, amounts, currencies):
+        """Convert a Series of amounts to TWD with one rate lookup per distinct currency"""
+        currencies = currencies.fillna('').replace('', 'TWD')
+        rate_by_currency = self._twd_rate_map(currencies.unique())
+        return amounts.fillna(0).astype(float) * currencies.map(rate_by_currency).fillna(1.0)
+    
+    def _split_broker_filter(self, broker_filter_list):
+        """Split broker filter entries into short broker codes and (short code, account_id) composite keys"""
+        short_names = []
+        composites = []
         
+        # Full and short names both resolve to the short code stored in t.broker_normalized,
+        # so the accounts join is no longer needed to match either spelling
         for broker_entry in broker_filter_list:
             if '|' in broker_entry:
                 # Composite key: specific account
-                broker_short, account_id = broker_entry.split('|', 1)
-                broker_conditions.append("(t.broker = ? AND t.account_id = ?)")
-                params.extend([broker_short, account_id])
+                broker_name, account_id = broker_entry.split('|', 1)
+                composites.append((BROKER_FULL_TO_SHORT.get(broker_name, broker_name), account_id))
             else:
-                # Regular broker: either full name or short name
-                short_name = broker_mapping.get(broker_entry, broker_entry)
-                if use_account_join:
-                    # When joining with accounts table, check both original name and mapped name
-                    # This handles cases where transactions table has Chinese names but accounts table has short codes
-                    broker_conditions.append("(t.broker = ? OR t.broker = ? OR a.broker = ? OR a.institution = ?)")
-                    params.extend([broker_entry, short_name, short_name, broker_entry])
-                else:
-                    # When not joining, check both original and mapped name in transaction table
-                    broker_conditions.append("(t.broker = ? OR t.broker = ?)")
-                    params.extend([broker_entry, short_name])
+                short_name = BROKER_FULL_TO_SHORT.get(broker_entry, broker_entry)
+                if short_name not in short_names:
+                    short_names.append(short_name)
         
-        return broker_conditions, params
+        return short_names, composites
 
     def get_transactions(self, filters=None):
         """Get filtered transactions with enhanced filtering and multi-select support"""
-        # Broker mapping for filtering
-        broker_mapping = {
-            '國泰證券': 'CATHAY',
-            'Charles Schwab': 'SCHWAB', 
-            'TD Ameritrade': 'TDA'
-        }
-        
-        query = """
-            SELECT t.*, a.institution, a.broker as account_broker
-            FROM transactions t
-            JOIN accounts a ON t.account_id = a.account_id
-            WHERE 1=1
-        """
+        return list(self.iter_transactions(filters))
+    
+    def iter_transactions(self, filters=None):
+        """Yield filtered transactions one at a time, for callers that stream rather than materialize them"""
+        # Reduce the filters to a shape (which clauses, how many placeholders) plus its parameters
+        shape = []
         params = []
         
         if filters:
             if filters.get('account_id'):
-                query += " AND t.account_id = ?"
+                shape.append(('account_id',))
                 params.append(filters['account_id'])
             
             # Handle multi-select broker filter with account separation support
             if filters.get('broker'):
                 broker_filter = filters['broker']
-                if isinstance(broker_filter, list) and len(broker_filter) > 0:
-                    broker_conditions, broker_params = self._parse_broker_filter(broker_filter, use_account_join=True)
-                    if broker_conditions:
-                        query += f" AND ({' OR '.join(broker_conditions)})"
-                        params.extend(broker_params)
-                elif isinstance(broker_filter, str):
+                if isinstance(broker_filter, str):
                     # Single broker (backward compatibility)
-                    if '|' in broker_filter:
-                        # Composite key: specific account
-                        broker_short, account_id = broker_filter.split('|', 1)
-                        query += " AND (t.broker = ? AND t.account_id = ?)"
-                        params.extend([broker_short, account_id])
-                    else:
-                        # Regular broker - check both original name and mapped name
-                        short_name = broker_mapping.get(broker_filter, broker_filter)
-                        query += " AND (t.broker = ? OR t.broker = ? OR a.broker = ? OR a.institution = ?)"
-                        params.extend([broker_filter, short_name, short_name, broker_filter])
+                    broker_filter = [broker_filter]
+                short_names, composites = self._split_broker_filter(broker_filter)
+                if short_names or composites:
+                    shape.append(('broker', len(short_names), len(composites)))
+                    params.extend(short_names)
+                    for short_name, account_id in composites:
+                        params.extend([short_name, account_id])
             
             # Handle multi-select symbol filter
             if filters.get('symbol'):
                 symbol_filter = filters['symbol']
                 if isinstance(symbol_filter, list):
-                    if len(symbol_filter) > 0:
-                        placeholders = ','.join(['?' for _ in symbol_filter])
-                        query += f" AND t.symbol IN ({placeholders})"
-                        params.extend(symbol_filter)
+                    shape.append(('symbol', len(symbol_filter)))
+                    params.extend(symbol_filter)
                 else:
                     # Single symbol (backward compatibility)
-                    query += " AND t.symbol LIKE ?"
+                    shape.append(('symbol_like',))
                     params.append(f"%{symbol_filter}%")
             
-            # Handle multi-select transaction type filter
+            # Handle multi-select transaction type filter (exact matching)
             if filters.get('transaction_type'):
                 transaction_type_filter = filters['transaction_type']
-                if isinstance(transaction_type_filter, list):
-                    if len(transaction_type_filter) > 0:
-                        conditions = []
-                        for trans_type in transaction_type_filter:
-                            # Use exact transaction_type matching for precise filtering
-                            conditions.append("t.transaction_type = ?")
-                            params.append(trans_type)
-                        
-                        if conditions:
-                            query += f" AND ({' OR '.join(conditions)})"
-                else:
-                    # Single transaction type (backward compatibility)
-                    query += " AND t.transaction_type = ?"
-                    params.append(transaction_type_filter)
+                if not isinstance(transaction_type_filter, list):
+                    transaction_type_filter = [transaction_type_filter]
+                shape.append(('transaction_type', len(transaction_type_filter)))
+                params.extend(transaction_type_filter)
             
             # Handle multi-select user filter
             if filters.get('user'):
                 user_filter = filters['user']
-                if isinstance(user_filter, list):
-                    if len(user_filter) > 0:
-                        placeholders = ','.join(['?' for _ in user_filter])
-                        query += f" AND t.user IN ({placeholders})"
-                        params.extend(user_filter)
-                else:
-                    # Single user (backward compatibility)
-                    query += " AND t.user = ?"
-                    params.append(user_filter)
+                if not isinstance(user_filter, list):
+                    user_filter = [user_filter]
+                shape.append(('user', len(user_filter)))
+                params.extend(user_filter)
             
             if filters.get('start_date'):
-                query += " AND t.transaction_date >= ?"
+                shape.append(('start_date',))
                 params.append(filters['start_date'])
             
             if filters.get('end_date'):
-                query += " AND t.transaction_date <= ?"
+                shape.append(('end_date',))
                 params.append(filters['end_date'])
             
             if filters.get('year'):
-                query += " AND strftime('%Y', t.transaction_date) = ?"
-                params.append(str(filters['year']))
+                year = int(filters['year'])
+                shape.append(('year',))
+                params.extend([f"{year}-01-01", f"{year + 1}-01-01"])
+            
+            # Optional pagination (parameters bind after the WHERE clause ones)
+            if filters.get('limit') is not None:
+                shape.append(('limit',))
+                params.append(int(filters['limit']))
+            
+            if filters.get('offset'):
+                shape.append(('offset',))
+                params.append(int(filters['offset']))
         
-        query += " ORDER BY t.transaction_date DESC, t.id DESC"
+        query = _build_transactions_query(tuple(shape))
         
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row  # Column names resolved once per cursor, not per row
             cursor.execute(query, params)
             
-            # Get transactions and add Category and Action fields
-            transactions = []
-            for row in cursor.fetchall():
-                transaction = dict(zip([col[0] for col in cursor.description], row))
+            # Get transactions and add Category and Action fields; the mapping only depends on the type,
+            # whether the row has a symbol and the sign of its amount, so it runs once per distinct combination
+            category_actions = {}
+            for row in iter_batches(cursor, TRANSACTION_STREAM_BATCH):
+                transaction = dict(row)
+                # Internal filter column from the schema migration, not part of the transaction record
+                transaction.pop('broker_normalized', None)
+                transaction_type = transaction.get('transaction_type')
+                symbol = transaction.get('symbol')
+                net_amount = transaction.get('net_amount')
+                amount = float(net_amount) if net_amount else 0
+                key = (transaction_type, not symbol or symbol == 'nan', amount > 0, amount < 0)
                 
                 # Add Category and Action fields based on transaction_type
-                category_action = self.map_transaction_to_category_action(
-                    transaction.get('transaction_type'),
-                    transaction.get('symbol'),
-                    transaction.get('net_amount')
-                )
+                category_action = category_actions.get(key)
+                if category_action is None:
+                    category_action = self.map_transaction_to_category_action(transaction_type, symbol, net_amount)
+                    category_actions[key] = category_action
                 transaction['category'] = category_action['category']
                 transaction['action'] = category_action['action']
                 
-                transactions.append(transaction)
-            
-            return transactions
+                yield transaction
     
-    def get_portfolio_summary(self, filters=None):
-        """Get enhanced portfolio summary with fees and multi-select support, converted to TWD"""
-        # Broker mapping for filtering
-        broker_mapping = {
-            '國泰證券': 'CATHAY',
-            'Charles Schwab': 'SCHWAB', 
-            'TD Ameritrade': 'TDA'
-        }
-        
-        # Get all transactions with filtering, but include currency for conversion
-        query = """
-            SELECT 
-                t.net_amount,
-                t.fee,
-                t.tax,
-                t.transaction_type,
-                t.symbol,
-                t.currency
-            FROM transactions t
-            WHERE 1=1
-        """
-        
+    def _build_tx_filter(self, filters, *, include_date=True, include_symbol=True, include_type=True):
+        """Build the WHERE conditions (joined with AND, no leading AND) and parameters for a transactions filter"""
+        # Reduce the filters to a shape plus parameters; the SQL text per shape is built once and reused
+        shape = []
         params = []
-        if filters:
-            # Handle multi-select broker filter with account separation support
-            if filters.get('broker'):
-                broker_filter = filters['broker']
-                if isinstance(broker_filter, list) and len(broker_filter) > 0:
-                    broker_conditions, broker_params = self._parse_broker_filter(broker_filter, use_account_join=False)
-                    if broker_conditions:
-                        query += f" AND ({' OR '.join(broker_conditions)})"
-                        params.extend(broker_params)
-                elif isinstance(broker_filter, str):
-                    # Single broker (backward compatibility)
-                    if '|' in broker_filter:
-                        # Composite key: specific account
-                        broker_short, account_id = broker_filter.split('|', 1)
-                        query += " AND (t.broker = ? AND t.account_id = ?)"
-                        params.extend([broker_short, account_id])
-                    else:
-                        # Regular broker - check both original name and mapped name
-                        short_name = broker_mapping.get(broker_filter, broker_filter)
-                        query += " AND (t.broker = ? OR t.broker = ?)"
-                        params.extend([broker_filter, short_name])
-            
-            # Handle multi-select symbol filter
-            if filters.get('symbol'):
-                symbol_filter = filters['symbol']
-                if isinstance(symbol_filter, list):
-                    if len(symbol_filter) > 0:
-                        placeholders = ','.join(['?' for _ in symbol_filter])
-                        query += f" AND t.symbol IN ({placeholders})"
-                        params.extend(symbol_filter)
-                else:
-                    # Single symbol (backward compatibility)
-                    query += " AND t.symbol = ?"
-                    params.append(symbol_filter)
-            
-            # Handle multi-select transaction type filter
-            if filters.get('transaction_type'):
-                transaction_type_filter = filters['transaction_type']
-                if isinstance(transaction_type_filter, list):
-                    if len(transaction_type_filter) > 0:
-                        conditions = []
-                        for trans_type in transaction_type_filter:
-                            # Use exact transaction_type matching for precise filtering
-                            conditions.append("t.transaction_type = ?")
-                            params.append(trans_type)
-                        
-                        if conditions:
-                            query += f" AND ({' OR '.join(conditions)})"
-                else:
-                    # Single transaction type (backward compatibility) - use exact matching
-                    query += " AND t.transaction_type = ?"
-                    params.append(transaction_type_filter)
-            
+        if not filters:
+            return '', params
+        
+        if include_date:
             if filters.get('year'):
-                query += " AND strftime('%Y', t.transaction_date) = ?"
-                params.append(str(filters['year']))
+                year = int(filters['year'])
+                shape.append(('year',))
+                params.extend([f"{year}-01-01", f"{year + 1}-01-01"])
             
             if filters.get('start_date'):
-                query += " AND t.transaction_date >= ?"
+                shape.append(('start_date',))
                 params.append(filters['start_date'])
             
             if filters.get('end_date'):
-                query += " AND t.transaction_date <= ?"
+                shape.append(('end_date',))
                 params.append(filters['end_date'])
         
-        # Execute query and convert amounts to TWD
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            
-            # Initialize totals in TWD
-            total_sales_twd = 0
-            total_purchases_twd = 0
-            total_dividends_twd = 0
-            total_fees_twd = 0
-            total_taxes_twd = 0
-            total_deposits_twd = 0
-            total_withdrawals_twd = 0
-            total_transactions = 0
-            
-            # Process each transaction and convert to TWD
-            for row in cursor.fetchall():
-                net_amount, fee, tax, transaction_type, symbol, currency = row
-                
-                # Convert amounts to TWD
-                net_amount_twd = self.convert_to_twd(net_amount or 0, currency or 'TWD')
-                fee_twd = self.convert_to_twd(fee or 0, currency or 'TWD')
-                tax_twd = self.convert_to_twd(tax or 0, currency or 'TWD')
-                
-                total_transactions += 1
-                total_fees_twd += fee_twd
-                total_taxes_twd += tax_twd
-                
-                # Categorize by transaction type
-                if transaction_type == 'SELL':
-                    total_sales_twd += net_amount_twd
-                elif transaction_type == 'BUY':
-                    total_purchases_twd += abs(net_amount_twd)
-                elif transaction_type == 'DIVIDEND':
-                    total_dividends_twd += net_amount_twd
-                elif net_amount_twd > 0 and symbol is None:  # Deposit
-                    total_deposits_twd += net_amount_twd
-                elif net_amount_twd < 0 and symbol is None:  # Withdrawal
-                    total_withdrawals_twd += abs(net_amount_twd)
-            
-            # Calculate CORRECTED realized P&L (only from sold quantities) 
-            realized_gain_loss_twd = self._calculate_true_realized_pnl(filters)
-            net_after_fees_twd = realized_gain_loss_twd - total_fees_twd - total_taxes_twd
-            
-            # Get detailed breakdown of realized P&L by symbol
-            realized_pnl_breakdown = self._get_realized_pnl_breakdown(filters)
-            
-            # Calculate alternative P&L views
-            current_holdings_realized_pnl = sum([item['realized_pnl_twd'] for item in realized_pnl_breakdown if item['remaining_shares'] > 0])
-            closed_positions_realized_pnl = sum([item['realized_pnl_twd'] for item in realized_pnl_breakdown if item['remaining_shares'] == 0])
-            
-            # Calculate unrealized P&L for current holdings
-            unrealized_pnl_data = self.calculate_unrealized_pnl(filters)
-            unrealized_pnl_twd = unrealized_pnl_data.get('unrealized_pnl', 0)
-            
-            # Calculate True Cash Earnings
-            # True Cash Earnings = Net Profit + Unrealized P&L + Dividends - Net Cash Invested  
-            net_cash_invested = total_deposits_twd - total_withdrawals_twd
-            true_cash_earnings = net_after_fees_twd + unrealized_pnl_twd + total_dividends_twd - net_cash_invested
-            
-            return {
-                'total_sales': total_sales_twd,
-                'total_purchases': total_purchases_twd,
-                'total_dividends': total_dividends_twd,
-                'total_fees': total_fees_twd,
-                'total_taxes': total_taxes_twd,
-                'total_deposits': total_deposits_twd,
-                'total_withdrawals': total_withdrawals_twd,
-                'total_transactions': total_transactions,
-                'realized_gain_loss': realized_gain_loss_twd,
-                'net_after_fees': net_after_fees_twd,
-                'unrealized_pnl': unrealized_pnl_twd,
-                'net_cash_invested': net_cash_invested,
-                'true_cash_earnings': true_cash_earnings,
-                'realized_pnl_breakdown': realized_pnl_breakdown,
-                'alternative_views': {
-                    'current_holdings_realized_pnl': current_holdings_realized_pnl,
-                    'closed_positions_realized_pnl': closed_positions_realized_pnl,
-                    'explanation': 'current_holdings_realized_pnl includes only gains from stocks still held; closed_positions_realized_pnl includes gains from fully sold positions'
-                }
-            }
+        # Handle multi-select symbol filter
+        if include_symbol and filters.get('symbol'):
+            symbol_filter = filters['symbol']
+            if isinstance(symbol_filter, list):
+                if len(symbol_filter) > 0:
+                    shape.append(('symbol', len(symbol_filter)))
+                    params.extend(symbol_filter)
+            else:
+                # Single symbol (backward compatibility)
+                shape.append(('symbol', 0))
+                params.append(symbol_filter)
+        
+        # Handle multi-select transaction type filter
+        if include_type and filters.get('transaction_type'):
+            transaction_type_filter = filters['transaction_type']
+            if isinstance(transaction_type_filter, list):
+                if len(transaction_type_filter) > 0:
+                    shape.append(('transaction_type', len(transaction_type_filter)))
+                    params.extend(transaction_type_filter)
+            else:
+                # Single transaction type (backward compatibility) - use exact matching
+                shape.append(('transaction_type', 0))
+                params.append(transaction_type_filter)
+        
+        # Handle multi-select broker filter with account separation support
+        if filters.get('broker'):
+            broker_filter = filters['broker']
+            if isinstance(broker_filter, str):
+                # Single broker (backward compatibility)
+                broker_filter = [broker_filter]
+            short_names, composites = self._split_broker_filter(broker_filter)
+            if short_names or composites:
+                shape.append(('broker', len(short_names), len(composites)))
+                params.extend(short_names)
+                for short_name, account_id in composites:
+                    params.extend([short_name, account_id])
+        
+        return _build_tx_filter_sql(tuple(shape)), params
     
-    def _calculate_true_realized_pnl(self, filters=None):
-        """Calculate true realized P&L from only SOLD quantities using matched buy/sell pairs"""
-        # Broker mapping for filtering
-        broker_mapping = {
-            '國泰證券': 'CATHAY',
-            'Charles Schwab': 'SCHWAB', 
-            'TD Ameritrade': 'TDA'
-        }
-        
-        # Get position analysis query - same as portfolio_performance_analysis
-        positions_query = """
+    def iter_transactions_df(self, filters=None, chunksize=50000):
+        """Yield the filtered transactions (amounts, type, symbol, currency) as DataFrames of at most chunksize rows"""
+        filter_sql, params = self._build_tx_filter(filters)
+        query = """
             SELECT 
+                t.net_amount,
+                t.fee,
+                t.tax,
+                t.transaction_type,
                 t.symbol,
-                t.broker,
-                SUM(CASE WHEN t.transaction_type = '買進' OR t.transaction_type = 'BUY' THEN t.quantity ELSE 0 END) as total_bought,
-                SUM(CASE WHEN t.transaction_type = '賣出' OR t.transaction_type = 'SELL' THEN ABS(t.quantity) ELSE 0 END) as total_sold,
-                SUM(CASE WHEN t.transaction_type = '買進' OR t.transaction_type = 'BUY' THEN ABS(t.net_amount) ELSE 0 END) as total_invested,
-                SUM(CASE WHEN t.transaction_type = '賣出' OR t.transaction_type = 'SELL' THEN t.net_amount ELSE 0 END) as total_received,
                 t.currency
             FROM transactions t
-            WHERE t.symbol IS NOT NULL AND t.symbol != ''
-        """
-        
-        # Apply filters
-        params = []
-        if filters:
-            # Apply broker filter using improved logic
-            if filters.get('broker'):
-                broker_filter = filters['broker']
-                if isinstance(broker_filter, list) and len(broker_filter) > 0:
-                    # For each broker, check both original name and mapped name
-                    broker_conditions = []
-                    for broker in broker_filter:
-                        short_name = broker_mapping.get(broker, broker)
-                        if broker != short_name:
-                            # If there's a mapping, check both names
-                            broker_conditions.append("(t.broker = ? OR t.broker = ?)")
-                            params.extend([broker, short_name])
-                        else:
-                            # If no mapping, just check the original name
-                            broker_conditions.append("t.broker = ?")
-                            params.append(broker)
-                    
-                    if broker_conditions:
-                        positions_query += f" AND ({' OR '.join(broker_conditions)})"
-                elif isinstance(broker_filter, str):
-                    short_name = broker_mapping.get(broker_filter, broker_filter)
-                    if broker_filter != short_name:
-                        # If there's a mapping, check both names
-                        positions_query += " AND (t.broker = ? OR t.broker = ?)"
-                        params.extend([broker_filter, short_name])
-                    else:
-                        # If no mapping, just check the original name
-                        positions_query += " AND t.broker = ?"
-                        params.append(broker_filter)
-            
-            # Handle multi-select symbol filter - FIXED: This was missing!
-            if filters.get('symbol'):
-                symbol_filter = filters['symbol']
-                if isinstance(symbol_filter, list) and len(symbol_filter) > 0:
-                    placeholders = ','.join(['?' for _ in symbol_filter])
-                    positions_query += f" AND t.symbol IN ({placeholders})"
-                    params.extend(symbol_filter)
-                elif isinstance(symbol_filter, str):
-                    positions_query += " AND t.symbol = ?"
-                    params.append(symbol_filter)
-        
-        positions_query += " GROUP BY t.symbol, t.broker, t.currency ORDER BY t.symbol"
+            WHERE 1=1
+        """ + ((' AND ' + filter_sql) if filter_sql else '')
         
-        total_realized_gain_loss_twd = 0
+        with self.get_connection() as conn:
+            for chunk in pd.read_sql(query, conn, params=params, chunksize=chunksize):
+                yield chunk
+    
+    def get_portfolio_summary(self, filters=None):
+        """Get enhanced portfolio summary with fees and multi-select support, converted to TWD"""
+        # Dashboards re-request the same filters on every interaction; the data version retires entries
+        # after ingests, including those made by the parser scripts outside this process
+        key = (self.db_path, data_version(self.db_path), json.dumps(filters or {}, sort_keys=True, default=str))
+        summary = _summary_cache.get(key, _MISSING)
+        if summary is _MISSING:
+            summary = self._compute_portfolio_summary(filters)
+            _summary_cache[key] = summary
+        # Callers only serialize it or set top-level keys, so a shallow copy keeps the cached summary intact
+        return dict(summary)
+    
+    def _compute_portfolio_summary(self, filters=None):
+        """Compute the portfolio summary behind get_portfolio_summary"""
+        filter_sql, params = self._build_tx_filter(filters)
+        filter_sql = (' AND ' + filter_sql) if filter_sql else ''
+        
+        # One rate per currency, inlined as a CTE so SQLite converts and aggregates in a single pass
+        fx_rows = list(self._twd_rate_map(self.get_currencies()).items())
+        fx_values = ', '.join('(?, ?)' for _ in fx_rows)
+        fx_params = [value for row in fx_rows for value in row]
+        
+        # Categorize by transaction type; deposits/withdrawals are the remaining symbol-less cash movements
+        query = f"""
+            WITH fx(currency, rate) AS (VALUES {fx_values}),
+            rated AS (
+                SELECT t.net_amount, t.fee, t.tax, t.transaction_type, t.symbol,
+                       COALESCE(fx.rate, 1.0) AS rate
+                FROM transactions t
+                LEFT JOIN fx ON fx.currency = COALESCE(NULLIF(t.currency, ''), 'TWD')
+                WHERE 1=1 {filter_sql}
+            )
+            SELECT
+                TOTAL(CASE WHEN transaction_type = 'SELL' THEN net_amount * rate END),
+                TOTAL(CASE WHEN transaction_type = 'BUY' THEN ABS(net_amount * rate) END),
+                TOTAL(CASE WHEN transaction_type = 'DIVIDEND' THEN net_amount * rate END),
+                TOTAL(CASE WHEN COALESCE(transaction_type, '') NOT IN ('SELL', 'BUY', 'DIVIDEND')
+                           AND symbol IS NULL AND net_amount > 0 THEN net_amount * rate END),
+                TOTAL(CASE WHEN COALESCE(transaction_type, '') NOT IN ('SELL', 'BUY', 'DIVIDEND')
+                           AND symbol IS NULL AND net_amount < 0 THEN ABS(net_amount * rate) END),
+                TOTAL(fee * rate),
+                TOTAL(tax * rate),
+                COUNT(*)
+            FROM rated
+        """
         
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(positions_query, params)
-            positions_data = cursor.fetchall()
-            
-            for row in positions_data:
-                symbol, broker, bought, sold, invested, received, currency = row
-                
-                # Only calculate realized P&L for sold quantities
-                if sold > 0:
-                    # Calculate realized gain/loss: received from sales minus cost basis of sold shares
-                    cost_of_sold_shares = invested * (sold / bought) if bought > 0 else 0
-                    realized_gain_loss = received - cost_of_sold_shares
-                    
-                    # Convert to TWD
-                    realized_gain_loss_twd = self.convert_to_twd(realized_gain_loss, currency or 'TWD')
-                    total_realized_gain_loss_twd += realized_gain_loss_twd
+            (total_sales_twd, total_purchases_twd, total_dividends_twd, total_deposits_twd,
+             total_withdrawals_twd, total_fees_twd, total_taxes_twd,
+             total_transactions) = conn.execute(query, fx_params + params).fetchone()
+        
+        # Get detailed breakdown of realized P&L by symbol; the total is derived from it so the two cannot drift
+        realized_pnl_breakdown = self._get_realized_pnl_breakdown(filters)
+        
+        # Calculate CORRECTED realized P&L (only from sold quantities) and the alternative
+        # P&L views (still held vs fully sold) in a single pass over the breakdown
+        realized_gain_loss_twd = 0
+        current_holdings_realized_pnl = 0
+        closed_positions_realized_pnl = 0
+        for item in realized_pnl_breakdown:
+            realized_gain_loss_twd += item['realized_pnl_twd']
+            if item['remaining_shares'] > 0:
+                current_holdings_realized_pnl += item['realized_pnl_twd']
+            elif item['remaining_shares'] == 0:
+                closed_positions_realized_pnl += item['realized_pnl_twd']
+        net_after_fees_twd = realized_gain_loss_twd - total_fees_twd - total_taxes_twd
+        
+        # Calculate unrealized P&L for current holdings
+        unrealized_pnl_data = self.calculate_unrealized_pnl(filters)
+        unrealized_pnl_twd = unrealized_pnl_data.get('unrealized_pnl', 0)
+        
+        # Calculate True Cash Earnings
+        # True Cash Earnings = Net Profit + Unrealized P&L + Dividends - Net Cash Invested  
+        net_cash_invested = total_deposits_twd - total_withdrawals_twd
+        true_cash_earnings = net_after_fees_twd + unrealized_pnl_twd + total_dividends_twd - net_cash_invested
         
-        return total_realized_gain_loss_twd
+        return {
+            'total_sales': total_sales_twd,
+            'total_purchases': total_purchases_twd,
+            'total_dividends': total_dividends_twd,
+            'total_fees': total_fees_twd,
+            'total_taxes': total_taxes_twd,
+            'total_deposits': total_deposits_twd,
+            'total_withdrawals': total_withdrawals_twd,
+            'total_transactions': total_transactions,
+            'realized_gain_loss': realized_gain_loss_twd,
+            'net_after_fees': net_after_fees_twd,
+            'unrealized_pnl': unrealized_pnl_twd,
+            'net_cash_invested': net_cash_invested,
+            'true_cash_earnings': true_cash_earnings,
+            'realized_pnl_breakdown': realized_pnl_breakdown,
+            'alternative_views': {
+                'current_holdings_realized_pnl': current_holdings_realized_pnl,
+                'closed_positions_realized_pnl': closed_positions_realized_pnl,
+                'explanation': 'current_holdings_realized_pnl includes only gains from stocks still held; closed_positions_realized_pnl includes gains from fully sold positions'
+            }
+        }
+    
+    def _realized_pnl_arrays(self, positions_data):
+        """Run (symbol, broker, bought, sold, invested, received, currency) rows through realized_pnl_kernel;
+        returns (sold, cost of sold shares, P&L, P&L in TWD) arrays aligned with the rows"""
+        _, _, bought, sold, invested, received, currency = zip(*positions_data)
+        currency = [value or 'TWD' for value in currency]
+        rate_by_currency = self._twd_rate_map(currency)
+        sold = np.array([value or 0 for value in sold], dtype=np.float64)
+        cost_of_sold_shares, realized_gain_loss, realized_gain_loss_twd = realized_pnl_kernel(
+            np.array([value or 0 for value in bought], dtype=np.float64),
+            sold,
+            np.array([value or 0 for value in invested], dtype=np.float64),
+            np.array([value or 0 for value in received], dtype=np.float64),
+            np.array([rate_by_currency[value] for value in currency], dtype=np.float64)
+        )
+        return sold, cost_of_sold_shares, realized_gain_loss, realized_gain_loss_twd
         
     def _get_realized_pnl_breakdown(self, filters=None):
         """Get detailed breakdown of realized P&L by symbol"""
-        # Broker mapping for filtering
-        broker_mapping = {
-            '國泰證券': 'CATHAY',
-            'Charles Schwab': 'SCHWAB', 
-            'TD Ameritrade': 'TDA'
-        }
-        
         # Get position analysis query
         positions_query = """
             SELECT 
                 t.symbol,
                 t.broker,
-                SUM(CASE WHEN t.transaction_type = '買進' OR t.transaction_type = 'BUY' THEN t.quantity ELSE 0 END) as total_bought,
-                SUM(CASE WHEN t.transaction_type = '賣出' OR t.transaction_type = 'SELL' THEN ABS(t.quantity) ELSE 0 END) as total_sold,
-                SUM(CASE WHEN t.transaction_type = '買進' OR t.transaction_type = 'BUY' THEN ABS(t.net_amount) ELSE 0 END) as total_invested,
-                SUM(CASE WHEN t.transaction_type = '賣出' OR t.transaction_type = 'SELL' THEN t.net_amount ELSE 0 END) as total_received,
+                SUM(CASE WHEN t.transaction_type IN ('買進', 'BUY') THEN t.quantity ELSE 0 END) as total_bought,
+                SUM(CASE WHEN t.transaction_type IN ('賣出', 'SELL') THEN ABS(t.quantity) ELSE 0 END) as total_sold,
+                SUM(CASE WHEN t.transaction_type IN ('買進', 'BUY') THEN ABS(t.net_amount) ELSE 0 END) as total_invested,
+                SUM(CASE WHEN t.transaction_type IN ('賣出', 'SELL') THEN t.net_amount ELSE 0 END) as total_received,
                 t.currency
             FROM transactions t
             WHERE t.symbol IS NOT NULL AND t.symbol != ''
         """
         
-        # Apply filters
-        params = []
-        if filters:
-            # Handle multi-select broker filter
-            if filters.get('broker'):
-                broker_filter = filters['broker']
-                if isinstance(broker_filter, list) and len(broker_filter) > 0:
-                    short_names = [broker_mapping.get(broker, broker) for broker in broker_filter]
-                    placeholders = ','.join(['?' for _ in short_names])
-                    positions_query += f" AND t.broker IN ({placeholders})"
-                    params.extend(short_names)
-                elif isinstance(broker_filter, str):
-                    short_name = broker_mapping.get(broker_filter, broker_filter)
-                    positions_query += " AND t.broker = ?"
-                    params.append(short_name)
+        # Apply broker and symbol filters; a date window would drop the cost basis of earlier buys
+        filter_sql, params = self._build_tx_filter(filters, include_date=False, include_type=False)
+        positions_query += (' AND ' + filter_sql) if filter_sql else ''
         
-        positions_query += " GROUP BY t.symbol, t.broker, t.currency ORDER BY t.symbol"
+        # No ORDER BY: SQLite would sort with a temp B-tree; the few aggregated rows are sorted in Python instead
+        positions_query += " GROUP BY t.symbol, t.broker, t.currency"
         
         breakdown = []
         
@@ -1110,110 +1498,57 @@ class PortfolioAPI:
             cursor = conn.cursor()
             cursor.execute(positions_query, params)
             positions_data = cursor.fetchall()
+        
+        if not positions_data:
+            return breakdown
+        positions_data.sort(key=lambda row: row[0])
+        
+        sold_array, cost_array, pnl_array, pnl_twd_array = self._realized_pnl_arrays(positions_data)
+        
+        # Only include positions that have been sold
+        for i in np.flatnonzero(sold_array > 0):
+            symbol, broker, bought, sold, invested, received, currency = positions_data[i]
             
-            for row in positions_data:
-                symbol, broker, bought, sold, invested, received, currency = row
-                
-                # Only include positions that have been sold
-                if sold > 0:
-                    # Calculate realized gain/loss: received from sales minus cost basis of sold shares
-                    cost_of_sold_shares = invested * (sold / bought) if bought > 0 else 0
-                    realized_gain_loss = received - cost_of_sold_shares
-                    
-                    # Convert to TWD
-                    realized_gain_loss_twd = self.convert_to_twd(realized_gain_loss, currency or 'TWD')
-                    
-                    # Calculate if this position is still held or completely sold
-                    remaining_shares = bought - sold
-                    
-                    breakdown.append({
-                        'symbol': symbol,
-                        'broker': broker,
-                        'total_bought': bought,
-                        'total_sold': sold,
-                        'remaining_shares': remaining_shares,
-                        'total_invested': invested,
-                        'total_received': received,
-                        'cost_of_sold_shares': cost_of_sold_shares,
-                        'realized_pnl': realized_gain_loss,
-                        'realized_pnl_twd': realized_gain_loss_twd,
-                        'currency': currency,
-                        'position_status': 'CLOSED' if remaining_shares == 0 else 'PARTIAL'
-                    })
+            # Calculate if this position is still held or completely sold
+            remaining_shares = bought - sold
+            
+            breakdown.append({
+                'symbol': symbol,
+                'broker': broker,
+                'total_bought': bought,
+                'total_sold': sold,
+                'remaining_shares': remaining_shares,
+                'total_invested': invested,
+                'total_received': received,
+                'cost_of_sold_shares': float(cost_array[i]),
+                'realized_pnl': float(pnl_array[i]),
+                'realized_pnl_twd': float(pnl_twd_array[i]),
+                'currency': currency,
+                'position_status': 'CLOSED' if remaining_shares == 0 else 'PARTIAL'
+            })
         
         return breakdown
 
     def _get_current_holdings(self, filters=None):
         """Get current holdings (bought - sold quantities, including zero and negative holdings)"""
-        # Broker mapping for filtering
-        broker_mapping = {
-            '國泰證券': 'CATHAY',
-            'Charles Schwab': 'SCHWAB', 
-            'TD Ameritrade': 'TDA'
-        }
-        
         holdings_query = """
             SELECT 
                 t.symbol,
                 t.broker,
-                SUM(CASE WHEN t.transaction_type = '買進' OR t.transaction_type = 'BUY' THEN t.quantity ELSE 0 END) as bought_qty,
-                SUM(CASE WHEN t.transaction_type = '賣出' OR t.transaction_type = 'SELL' THEN ABS(t.quantity) ELSE 0 END) as sold_qty,
-                SUM(CASE WHEN t.transaction_type = '買進' OR t.transaction_type = 'BUY' THEN t.quantity 
-                         WHEN t.transaction_type = '賣出' OR t.transaction_type = 'SELL' THEN -ABS(t.quantity) ELSE 0 END) as current_holding,
-                AVG(CASE WHEN t.transaction_type = '買進' OR t.transaction_type = 'BUY' THEN t.price ELSE NULL END) as avg_cost,
-                SUM(CASE WHEN t.transaction_type = '買進' OR t.transaction_type = 'BUY' THEN ABS(t.net_amount) ELSE 0 END) as total_invested,
+                SUM(CASE WHEN t.transaction_type IN ('買進', 'BUY') THEN t.quantity ELSE 0 END) as bought_qty,
+                SUM(CASE WHEN t.transaction_type IN ('賣出', 'SELL') THEN ABS(t.quantity) ELSE 0 END) as sold_qty,
+                SUM(CASE WHEN t.transaction_type IN ('買進', 'BUY') THEN t.quantity 
+                         WHEN t.transaction_type IN ('賣出', 'SELL') THEN -ABS(t.quantity) ELSE 0 END) as current_holding,
+                AVG(CASE WHEN t.transaction_type IN ('買進', 'BUY') THEN t.price ELSE NULL END) as avg_cost,
+                SUM(CASE WHEN t.transaction_type IN ('買進', 'BUY') THEN ABS(t.net_amount) ELSE 0 END) as total_invested,
                 t.currency
             FROM transactions t 
             WHERE t.symbol IS NOT NULL AND t.symbol != ''
         """
         
-        # Apply filters  
-        params = []
-        if filters:
-            # Handle multi-select broker filter
-            if filters.get('broker'):
-                broker_filter = filters['broker']
-                if isinstance(broker_filter, list) and len(broker_filter) > 0:
-                    broker_conditions, broker_params = self._parse_broker_filter(broker_filter, use_account_join=False)
-                    if broker_conditions:
-                        holdings_query += f" AND ({' OR '.join(broker_conditions)})"
-                        params.extend(broker_params)
-                elif isinstance(broker_filter, str):
-                    # Single broker (backward compatibility)
-                    if '|' in broker_filter:
-                        # Composite key: specific account
-                        broker_short, account_id = broker_filter.split('|', 1)
-                        holdings_query += " AND (t.broker = ? AND t.account_id = ?)"
-                        params.extend([broker_short, account_id])
-                    else:
-                        # Regular broker - check both original name and mapped name
-                        short_name = broker_mapping.get(broker_filter, broker_filter)
-                        holdings_query += " AND (t.broker = ? OR t.broker = ?)"
-                        params.extend([broker_filter, short_name])
-            
-            # Handle multi-select symbol filter
-            if filters.get('symbol'):
-                symbol_filter = filters['symbol']
-                if isinstance(symbol_filter, list) and len(symbol_filter) > 0:
-                    placeholders = ','.join(['?' for _ in symbol_filter])
-                    holdings_query += f" AND t.symbol IN ({placeholders})"
-                    params.extend(symbol_filter)
-                elif isinstance(symbol_filter, str):
-                    holdings_query += " AND t.symbol = ?"
-                    params.append(symbol_filter)
-            
-            # Handle date filters
-            if filters.get('start_date'):
-                holdings_query += " AND t.transaction_date >= ?"
-                params.append(filters['start_date'])
-            
-            if filters.get('end_date'):
-                holdings_query += " AND t.transaction_date <= ?"
-                params.append(filters['end_date'])
-            
-            if filters.get('year'):
-                holdings_query += " AND strftime('%Y', t.transaction_date) = ?"
-                params.append(str(filters['year']))
+        # Apply broker, symbol and date filters
+        filter_sql, params = self._build_tx_filter(filters, include_type=False)
+        holdings_query += (' AND ' + filter_sql) if filter_sql else ''
         
         holdings_query += " GROUP BY t.symbol, t.broker, t.currency HAVING current_holding != 0"
         
@@ -1222,62 +1557,177 @@ class PortfolioAPI:
             cursor.execute(holdings_query, params)
             return cursor.fetchall()
 
-    def _get_current_prices_enhanced(self, symbols_with_brokers):
-        """Fetch current prices for symbols with enhanced Yahoo Finance integration and caching"""
-        import yfinance as yf
+    def _is_price_cached(self, symbol):
+        """Whether a symbol has a fresh cached price or a remembered failed lookup"""
+        return symbol in self._stock_price_cache or symbol in self._price_miss_cache
+    
+    def _bulk_refresh_prices(self, symbols_with_brokers):
+        """Warm the stock price cache for all uncached symbols with one batched yf.download request.
+        Returns the symbols the batch covered but got no price for."""
+        # Several local symbols can map to the same Yahoo ticker (e.g. 2330 and 台積電)
+        yahoo_to_symbols = {}
+        for symbol_info in symbols_with_brokers:
+            symbol, broker = split_symbol_info(symbol_info)
+            if not symbol or self._is_price_cached(symbol):
+                continue
+            yahoo_to_symbols.setdefault(self._get_yahoo_symbol(symbol, broker), []).append(symbol)
+        
+        # Unexpired prices persisted by this or an earlier process need no request at all
+        persisted = self._read_cache_kv([f"price:{symbol}" for symbols in yahoo_to_symbols.values() for symbol in symbols])
+        if persisted:
+            for yahoo_symbol in list(yahoo_to_symbols):
+                symbols = yahoo_to_symbols[yahoo_symbol]
+                for symbol in symbols:
+                    if f"price:{symbol}" in persisted:
+                        self._stock_price_cache[symbol] = persisted[f"price:{symbol}"]
+                remaining = [symbol for symbol in symbols if f"price:{symbol}" not in persisted]
+                if remaining:
+                    yahoo_to_symbols[yahoo_symbol] = remaining
+                else:
+                    del yahoo_to_symbols[yahoo_symbol]
+        
+        # Even a single symbol goes through the download, so history() is only a fallback for batch failures
+        if not yahoo_to_symbols or not self._rate_limiter.acquire():
+            return set()
         
+        try:
+            yahoo_symbols = sorted(yahoo_to_symbols)  # stable ticker order across identical requests
+            data = yf.download(" ".join(yahoo_symbols), period="5d", interval="1d",
+                               group_by='ticker', threads=True, progress=False)
+        except Exception as e:
+            if is_rate_limited_error(e):
+                logger.warning("Rate limited on batched price download, falling back to per-symbol fetch")
+                self._rate_limiter.record_rate_limited()
+            else:
+                logger.warning("Batched price download failed: %s", e)
+            return set()
+        
+        if data is None or data.empty:
+            return set()
+        
+        closes = last_closes(data, yahoo_symbols)
+        fetched = 0
+        fetched_prices = {}
+        missing = set()
+        for yahoo_symbol, symbols in yahoo_to_symbols.items():
+            # Symbols without data are not cached so the per-symbol fallbacks still get a chance
+            if closes.get(yahoo_symbol) is not None:
+                for symbol in symbols:
+                    self._stock_price_cache[symbol] = closes[yahoo_symbol]
+                    fetched_prices[f"price:{symbol}"] = closes[yahoo_symbol]
+                fetched += 1
+            elif yahoo_symbol in closes:
+                missing.update(symbols)
+        
+        if fetched:
+            self._rate_limiter.record_success()
+            self._write_cache_kv(fetched_prices, CACHE_TTL_PRICE_PERSISTED)
+            logger.info("Batched price download cached %d/%d symbols", fetched, len(yahoo_symbols))
+        return missing
+    
+    def _get_current_prices_enhanced(self, symbols_with_brokers, max_workers=8):
+        """Fetch current prices for symbols with enhanced Yahoo Finance integration and caching"""
         prices = {}
         errors = []
         symbols_to_fetch = []
         
-        # Clear cache if invalid and set new timestamp
-        if not self._is_cache_valid():
-            self._stock_price_cache.clear()
-            self._forex_cache.clear()
-            # Set new cache timestamp immediately to avoid multiple clears
-            import time
-            self._cache_timestamp = time.time()
+        # Only cache misses reach the batch (and Yahoo); symbols it already asked about skip
+        # straight to the info/fast_info fallbacks
+        uncached = [info for info in symbols_with_brokers if not self._is_price_cached(split_symbol_info(info)[0])]
+        batch_missing = self._bulk_refresh_prices(uncached) if uncached else set()
         
         # Check cache first for each symbol
         for symbol_info in symbols_with_brokers:
-            if isinstance(symbol_info, tuple):
-                symbol, broker = symbol_info
-            else:
-                symbol = symbol_info
-                broker = None
+            symbol, broker = split_symbol_info(symbol_info)
             
-            if self._is_cache_valid() and symbol in self._stock_price_cache:
-                cached_price = self._stock_price_cache[symbol]
+            if self._is_price_cached(symbol):
+                cached_price = self._stock_price_cache.get(symbol)
                 if cached_price is not None:
                     prices[symbol] = cached_price
+                elif symbol in self._price_miss_cache:
+                    errors.append({
+                        'symbol': symbol,
+                        'error': 'No price data available (recent lookup failed)'
+                    })
                 else:
-                    errors.append(symbol)
+                    # The cached price expired between the check and the read
+                    symbols_to_fetch.append(symbol_info)
             else:
                 symbols_to_fetch.append(symbol_info)
         
-        # Fetch only uncached symbols with rate limiting protection
-        for i, symbol_info in enumerate(symbols_to_fetch):
-            if isinstance(symbol_info, tuple):
-                symbol, broker = symbol_info
-            else:
-                symbol = symbol_info
-                broker = None
+        # Fetch only uncached symbols concurrently; the calls are network-bound and the shared
+        # rate limiter still paces them, so the threads only overlap the round trips
+        if symbols_to_fetch:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols_to_fetch))) as executor:
+                results = list(executor.map(lambda info: self._fetch_price_enhanced(info, batch_missing), symbols_to_fetch))
+            for symbol, current_price, error in results:
+                prices[symbol] = current_price
+                if error:
+                    errors.append(error)
+        
+        # Persist the prices fetched individually above
+        fetched_symbols = {split_symbol_info(info)[0] for info in symbols_to_fetch}
+        self._write_cache_kv({f"price:{symbol}": price for symbol, price in prices.items()
+                              if symbol in fetched_symbols and price}, CACHE_TTL_PRICE_PERSISTED)
+        
+        return prices, errors
+    
+    def _fetch_price_enhanced(self, symbol_info, batch_missing=()):
+        """Fetch one uncached symbol's price with rate limiting protection; returns (symbol, price or None, error or None)"""
+        symbol, broker = split_symbol_info(symbol_info)
+        try:
+            # Get enhanced Yahoo symbol
+            yahoo_symbol = self._get_yahoo_symbol(symbol, broker)
+            
+            # Take a token for the actual API call; while backing off, skip without caching so we retry later
+            if not self._rate_limiter.acquire():
+                return symbol, None, {
+                    'symbol': symbol,
+                    'yahoo_symbol': yahoo_symbol,
+                    'error': 'Rate limited, will retry later'
+                }
+            
+            ticker = yf.Ticker(yahoo_symbol)
             
+            # Try multiple methods to get price, cheapest first, stopping at the first that succeeds
+            current_price = None
+            rate_limited_attempts = 0
+            
+            def back_off(method):
+                """After a 429, wait with capped exponential backoff and jitter before the next method"""
+                nonlocal rate_limited_attempts
+                logger.warning("Rate limited on %s for %s, trying alternative methods", method, yahoo_symbol)
+                self._rate_limiter.record_rate_limited()
+                time.sleep(random.uniform(0, min(4.0, 0.5 * 2 ** rate_limited_attempts)))
+                rate_limited_attempts += 1
+            
+            # Method 1: fast_info (a small quote request, no DataFrame to build)
             try:
-                import time
-                import random
-                
-                # Apply request throttling only for actual API calls (not cached)
-                self._throttle_requests(is_cached_request=False)
-                
-                # Get enhanced Yahoo symbol
-                yahoo_symbol = self._get_yahoo_symbol(symbol, broker)
-                ticker = yf.Ticker(yahoo_symbol)
-                
-                # Try multiple methods to get price
-                current_price = None
-                
-                # Method 1: Historical data with appropriate period
+                fast_info = ticker.fast_info
+                if hasattr(fast_info, 'last_price') and fast_info.last_price:
+                    current_price = fast_info.last_price
+            except Exception as e:
+                if is_rate_limited_error(e):
+                    back_off('fast_info')
+                else:
+                    logger.warning("Fast info failed for %s: %s", yahoo_symbol, e)
+            
+            # Method 2: Try ticker info for real-time price
+            if current_price is None:
+                try:
+                    info = ticker.info
+                    if info and 'regularMarketPrice' in info and info['regularMarketPrice']:
+                        current_price = info['regularMarketPrice']
+                    elif info and 'previousClose' in info and info['previousClose']:
+                        current_price = info['previousClose']
+                except Exception as e:
+                    if is_rate_limited_error(e):
+                        back_off('info')
+                    else:
+                        logger.warning("Ticker info failed for %s: %s", yahoo_symbol, e)
+            
+            # Method 3: Historical data with appropriate period (already tried by the batch download)
+            if current_price is None and symbol not in batch_missing:
                 try:
                     period = "5d" if ".TW" in yahoo_symbol else "2d"  # Extended period for better data
                     hist = ticker.history(period=period, interval="1d")
@@ -1285,233 +1735,140 @@ class PortfolioAPI:
                     if not hist.empty:
                         current_price = hist['Close'].iloc[-1]
                 except Exception as e:
-                    error_msg = str(e).lower()
-                    if 'too many requests' in error_msg or '429' in error_msg or 'rate limit' in error_msg:
-                        print(f"Rate limited on historical data for {yahoo_symbol}, trying alternative methods")
+                    if is_rate_limited_error(e):
+                        logger.warning("Rate limited on historical data for %s", yahoo_symbol)
+                        self._rate_limiter.record_rate_limited()
                     else:
-                        print(f"Historical data failed for {yahoo_symbol}: {e}")
-                
-                # Method 2: Try ticker info for real-time price
-                if current_price is None:
-                    try:
-                        time.sleep(random.uniform(0.2, 0.5))  # Small delay between methods
-                        info = ticker.info
-                        if info and 'regularMarketPrice' in info and info['regularMarketPrice']:
-                            current_price = info['regularMarketPrice']
-                        elif info and 'previousClose' in info and info['previousClose']:
-                            current_price = info['previousClose']
-                    except Exception as e:
-                        error_msg = str(e).lower()
-                        if 'too many requests' in error_msg or '429' in error_msg or 'rate limit' in error_msg:
-                            print(f"Rate limited on info for {yahoo_symbol}")
-                        else:
-                            print(f"Ticker info failed for {yahoo_symbol}: {e}")
-                
-                # Method 3: Try fast_info (newer yfinance feature)
-                if current_price is None:
-                    try:
-                        time.sleep(random.uniform(0.2, 0.5))  # Small delay between methods
-                        fast_info = ticker.fast_info
-                        if hasattr(fast_info, 'last_price') and fast_info.last_price:
-                            current_price = fast_info.last_price
-                    except Exception as e:
-                        error_msg = str(e).lower()
-                        if 'too many requests' in error_msg or '429' in error_msg or 'rate limit' in error_msg:
-                            print(f"Rate limited on fast_info for {yahoo_symbol}")
-                        else:
-                            print(f"Fast info failed for {yahoo_symbol}: {e}")
+                        logger.warning("Historical data failed for %s: %s", yahoo_symbol, e)
+            
+            if current_price is not None and current_price > 0:
+                self._rate_limiter.record_success()
+                # Cache the result
+                self._stock_price_cache[symbol] = current_price
+                logger.debug("Successfully fetched price for %s: %s", symbol, current_price)
+                return symbol, current_price, None
+            
+            # Cache the None result to avoid repeated failed requests
+            self._price_miss_cache[symbol] = None
+            return symbol, None, {
+                'symbol': symbol,
+                'yahoo_symbol': yahoo_symbol,
+                'error': 'No price data available after trying all methods'
+            }
                 
-                if current_price is not None and current_price > 0:
-                    prices[symbol] = current_price
-                    # Cache the result
-                    self._stock_price_cache[symbol] = current_price
-                    # Update cache timestamp
-                    if self._cache_timestamp is None:
-                        import time
-                        self._cache_timestamp = time.time()
-                    print(f"Successfully fetched price for {symbol}: {current_price}")
-                else:
-                    prices[symbol] = None
-                    # Cache the None result to avoid repeated failed requests
-                    self._stock_price_cache[symbol] = None
-                    errors.append({
-                        'symbol': symbol,
-                        'yahoo_symbol': yahoo_symbol,
-                        'error': 'No price data available after trying all methods'
-                    })
-                    
-            except Exception as e:
-                yahoo_symbol = 'unknown'
-                try:
-                    yahoo_symbol = self._get_yahoo_symbol(symbol, broker)
-                except:
-                    pass
+        except Exception as e:
+            yahoo_symbol = 'unknown'
+            try:
+                yahoo_symbol = self._get_yahoo_symbol(symbol, broker)
+            except:
+                pass
+            
+            if is_rate_limited_error(e):
+                logger.warning("Rate limited fetching price for %s (%s), will use fallback", symbol, yahoo_symbol)
+                self._rate_limiter.record_rate_limited()
+                # For rate limiting, don't cache the error to allow retry later
+            else:
+                logger.warning("Error fetching price for %s (%s): %s", symbol, yahoo_symbol, e)
+                # Cache the None result to avoid repeated failed requests
+                self._price_miss_cache[symbol] = None
                 
-                error_msg = str(e).lower()
-                if 'too many requests' in error_msg or '429' in error_msg or 'rate limit' in error_msg:
-                    print(f"Rate limited fetching price for {symbol} ({yahoo_symbol}), will use fallback")
-                    # For rate limiting, don't cache the error to allow retry later
-                    prices[symbol] = None
-                else:
-                    print(f"Error fetching price for {symbol} ({yahoo_symbol}): {e}")
-                    prices[symbol] = None
-                    # Cache the None result to avoid repeated failed requests
-                    self._stock_price_cache[symbol] = None
-                    
-                errors.append({
-                    'symbol': symbol,
-                    'yahoo_symbol': yahoo_symbol,
-                    'error': str(e)
-                })
-        
-        return prices, errors
+            return symbol, None, {
+                'symbol': symbol,
+                'yahoo_symbol': yahoo_symbol,
+                'error': str(e)
+            }
 
-    def _get_current_prices(self, symbols):
+    def _get_current_prices(self, symbols, max_workers=8):
         """Legacy method - fetch current prices for symbols from Yahoo Finance with caching"""
-        import yfinance as yf
-        
         prices = {}
         symbols_to_fetch = []
         
+        # Only cache misses reach the batch (and Yahoo); a fully cached request touches neither
+        uncached = [symbol for symbol in symbols if not self._is_price_cached(symbol)]
+        batch_missing = self._bulk_refresh_prices(uncached) if uncached else set()
+        
         # Check cache first for each symbol
         for symbol in symbols:
-            if self._is_cache_valid() and symbol in self._stock_price_cache:
-                prices[symbol] = self._stock_price_cache[symbol]
+            if self._is_price_cached(symbol):
+                prices[symbol] = self._stock_price_cache.get(symbol)
             else:
                 symbols_to_fetch.append(symbol)
         
-        # Clear cache if invalid and set new timestamp
-        if not self._is_cache_valid():
-            self._stock_price_cache.clear()
-            self._forex_cache.clear()
-            # Set new cache timestamp immediately to avoid multiple clears
-            import time
-            self._cache_timestamp = time.time()
+        # Fetch the symbols the batch could not price concurrently; each waits on its own round trip
+        # and the shared rate limiter keeps pacing them
+        if symbols_to_fetch:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols_to_fetch))) as executor:
+                prices.update(zip(symbols_to_fetch, executor.map(
+                    lambda symbol: self._fetch_price(symbol, batch_missing), symbols_to_fetch)))
         
-        # Fetch only uncached symbols with rate limiting protection
-        for i, symbol in enumerate(symbols_to_fetch):
+        # Persist the prices fetched individually above
+        self._write_cache_kv({f"price:{symbol}": prices[symbol] for symbol in symbols_to_fetch
+                              if prices.get(symbol)}, CACHE_TTL_PRICE_PERSISTED)
+        return prices
+    
+    def _fetch_price(self, symbol, batch_missing=()):
+        """Fetch one uncached symbol's price with rate limiting protection; returns None when unavailable"""
+        try:
+            # Take a token for the actual API call; while backing off, skip without caching so we retry later
+            if not self._rate_limiter.acquire():
+                return None
+            
+            # Handle different stock markets
+            yahoo_symbol = self._get_yahoo_symbol(symbol)
+            ticker = yf.Ticker(yahoo_symbol)
+            
+            # Use longer period for Taiwan stocks for better data availability
+            period = "5d" if ".TW" in yahoo_symbol else "2d"
+            
             try:
-                import time
-                import random
-                
-                # Apply request throttling only for actual API calls (not cached)
-                self._throttle_requests(is_cached_request=False)
+                # The batch download already came back empty for these; go straight to the fallback
+                hist = ticker.history(period=period) if symbol not in batch_missing else pd.DataFrame()
                 
-                # Handle different stock markets
-                yahoo_symbol = self._get_yahoo_symbol(symbol)
-                ticker = yf.Ticker(yahoo_symbol)
-                
-                # Use longer period for Taiwan stocks for better data availability
-                period = "5d" if ".TW" in yahoo_symbol else "2d"
+                if not hist.empty:
+                    current_price = hist['Close'].iloc[-1]
+                    self._rate_limiter.record_success()
+                    # Cache the result
+                    self._stock_price_cache[symbol] = current_price
+                    return current_price
                 
-                try:
-                    hist = ticker.history(period=period)
-                    
-                    if not hist.empty:
-                        current_price = hist['Close'].iloc[-1]
-                        prices[symbol] = current_price
-                        # Cache the result
-                        self._stock_price_cache[symbol] = current_price
-                    else:
-                        # Try alternative method for Taiwan stocks
-                        if ".TW" in yahoo_symbol:
-                            try:
-                                time.sleep(random.uniform(0.3, 0.7))
-                                info = ticker.info
-                                if info and 'regularMarketPrice' in info:
-                                    prices[symbol] = info['regularMarketPrice']
-                                    self._stock_price_cache[symbol] = info['regularMarketPrice']
-                                else:
-                                    prices[symbol] = None
-                                    self._stock_price_cache[symbol] = None
-                            except Exception as info_error:
-                                error_msg = str(info_error).lower()
-                                if 'too many requests' in error_msg or '429' in error_msg or 'rate limit' in error_msg:
-                                    print(f"Rate limited on info method for {yahoo_symbol}")
-                                prices[symbol] = None
-                                self._stock_price_cache[symbol] = None
-                        else:
-                            prices[symbol] = None
-                            self._stock_price_cache[symbol] = None
-                except Exception as hist_error:
-                    error_msg = str(hist_error).lower()
-                    if 'too many requests' in error_msg or '429' in error_msg or 'rate limit' in error_msg:
-                        print(f"Rate limited on history method for {yahoo_symbol}, skipping caching")
-                        prices[symbol] = None
-                        # Don't cache rate limit errors to allow retry later
-                    else:
-                        print(f"History fetch failed for {yahoo_symbol}: {hist_error}")
-                        prices[symbol] = None
-                        self._stock_price_cache[symbol] = None
-                    
-            except Exception as e:
-                error_msg = str(e).lower()
-                if 'too many requests' in error_msg or '429' in error_msg or 'rate limit' in error_msg:
-                    print(f"Rate limited fetching price for {symbol}, will retry later")
-                    prices[symbol] = None
-                    # Don't cache rate limit errors
+                # Try alternative method for Taiwan stocks
+                current_price = None
+                if ".TW" in yahoo_symbol:
+                    try:
+                        info = ticker.info
+                        if info and 'regularMarketPrice' in info:
+                            current_price = info['regularMarketPrice']
+                    except Exception as info_error:
+                        if is_rate_limited_error(info_error):
+                            logger.warning("Rate limited on info method for %s", yahoo_symbol)
+                            self._rate_limiter.record_rate_limited()
+                if current_price is None:
+                    self._price_miss_cache[symbol] = None
                 else:
-                    print(f"Error fetching price for {symbol}: {e}")
-                    prices[symbol] = None
-        return prices
+                    self._stock_price_cache[symbol] = current_price
+                return current_price
+            except Exception as hist_error:
+                if is_rate_limited_error(hist_error):
+                    logger.warning("Rate limited on history method for %s, skipping caching", yahoo_symbol)
+                    self._rate_limiter.record_rate_limited()
+                    # Don't cache rate limit errors to allow retry later
+                else:
+                    logger.warning("History fetch failed for %s: %s", yahoo_symbol, hist_error)
+                    self._price_miss_cache[symbol] = None
+                return None
+                
+        except Exception as e:
+            if is_rate_limited_error(e):
+                logger.warning("Rate limited fetching price for %s, will retry later", symbol)
+                self._rate_limiter.record_rate_limited()
+                # Don't cache rate limit errors
+            else:
+                logger.warning("Error fetching price for %s: %s", symbol, e)
+            return None
     
     def _get_yahoo_symbol(self, symbol, broker=None):
         """Enhanced symbol mapping for all exchanges with comprehensive Taiwan stock support"""
-        # Taiwan stocks - numeric codes (4 digits)
-        if symbol.isdigit() and len(symbol) == 4:
-            return f"{symbol}.TW"
-        
-        # Taiwan stocks - Chinese names (comprehensive mapping)
-        taiwan_name_mapping = {
-            '台積電': '2330.TW',     # TSMC
-            '聯發科': '2454.TW',     # MediaTek
-            '鴻海': '2317.TW',       # Foxconn/Hon Hai
-            '中鋼': '2002.TW',       # China Steel
-            '富邦台50': '006208.TW', # Fubon Taiwan 50 ETF
-            '台塑': '1301.TW',       # Formosa Plastics
-            '台化': '1326.TW',       # Formosa Chemicals
-            '中華電': '2412.TW',     # Chunghwa Telecom
-            '台達電': '2308.TW',     # Delta Electronics
-            '國泰金': '2882.TW',     # Cathay Financial
-            '玉山金': '2884.TW',     # E.SUN Financial
-            '兆豐金': '2886.TW',     # Mega Financial
-            '富邦金': '2881.TW',     # Fubon Financial
-            '元大台灣50': '0050.TW', # Yuanta Taiwan 50 ETF (alternative name)
-            '台泥': '1101.TW',       # Taiwan Cement
-            '遠傳': '4904.TW',       # Far EasTone
-            '中信金': '2891.TW',     # CTBC Financial
-            '永豐金': '2890.TW',     # SinoPac Financial
-            '南亞': '1303.TW',       # Nan Ya Plastics
-            '華碩': '2357.TW',       # ASUSTek
-            '廣達': '2382.TW',       # Quanta Computer
-            '仁寶': '2324.TW',       # Compal Electronics
-            '和碩': '4938.TW',       # Pegatron
-            '英業達': '2356.TW',     # Inventec
-            '宏碁': '2353.TW',       # Acer
-            '緯創': '3231.TW',       # Wistron
-            '光寶科': '2301.TW',     # Lite-On Technology
-            '統一': '1216.TW',       # Uni-President
-            '味全': '1201.TW',       # Wei Chuan Foods
-            '長榮': '2603.TW',       # Evergreen Marine
-            '陽明': '2609.TW',       # Yang Ming Marine
-            '萬海': '2615.TW'        # Wan Hai Lines
-        }
-        
-        # Check Taiwan name mapping first
-        if symbol in taiwan_name_mapping:
-            return taiwan_name_mapping[symbol]
-        
-        # US stocks - check broker context
-        if broker in ['TDA', 'SCHWAB']:
-            return symbol  # AAPL, MSFT, etc. (no suffix needed)
-        
-        # Hong Kong stocks - .HK suffix
-        if symbol.isdigit() and len(symbol) in [1, 2, 3, 4, 5]:
-            # Could be Hong Kong stock, but need more context
-            pass
-        
-        # Default: return as-is for US stocks or unknown symbols
-        return symbol
+        return yahoo_symbol_for(symbol, broker)
 
     def calculate_unrealized_pnl(self, filters=None):
         """Calculate unrealized P&L for current holdings using Yahoo Finance prices"""
@@ -1528,66 +1885,70 @@ class PortfolioAPI:
                 'price_fetch_errors': []
             }
         
-        # Get unique symbols for price fetching
-        symbols = list(set([holding[0] for holding in holdings]))  # symbol is first column
+        # Get unique symbols for price fetching; sorting only keeps cache probes and batch requests deterministic
+        symbols = sorted({holding[0] for holding in holdings})  # symbol is first column
         current_prices = self._get_current_prices(symbols)
         
-        total_unrealized_pnl_twd = 0
-        total_market_value_twd = 0
-        total_cost_basis_twd = 0
-        total_shares = 0
-        holdings_details = []
-        price_fetch_errors = []
-        
-        for holding in holdings:
-            symbol, broker, bought_qty, sold_qty, current_holding, avg_cost, total_invested, currency = holding
-            
-            current_price = current_prices.get(symbol)
-            if current_price is None:
-                price_fetch_errors.append(symbol)
-                # Use avg cost as fallback
-                current_price = avg_cost or 0
-            
-            # Calculate cost basis for remaining shares
-            cost_basis = (total_invested * (current_holding / bought_qty)) if bought_qty > 0 else 0
-            market_value = current_holding * current_price
-            
-            # Convert to TWD
-            cost_basis_twd = self.convert_to_twd(cost_basis, currency or 'TWD')
-            market_value_twd = self.convert_to_twd(market_value, currency or 'TWD')
-            
-            unrealized_pnl_twd = market_value_twd - cost_basis_twd
-            
-            total_unrealized_pnl_twd += unrealized_pnl_twd
-            total_market_value_twd += market_value_twd
-            total_cost_basis_twd += cost_basis_twd
-            total_shares += current_holding
-            
-            # Add detailed holding information
-            holdings_details.append({
-                'symbol': symbol,
-                'broker': broker,
-                'shares': current_holding,
-                'avg_cost': avg_cost,
-                'current_price': current_price,
-                'cost_basis': cost_basis,
-                'market_value': market_value,
-                'unrealized_pnl': unrealized_pnl_twd,
-                'currency': currency
-            })
+        # One column per holdings field, so the per-holding math runs as whole-array operations
+        df = pd.DataFrame(holdings, columns=['symbol', 'broker', 'bought_qty', 'sold_qty', 'current_holding',
+                                             'avg_cost', 'total_invested', 'currency'])
+        
+        # Use avg cost as fallback when no price was fetched
+        current_price = df['symbol'].map(current_prices)
+        price_fetch_errors = df.loc[current_price.isna(), 'symbol'].tolist()
+        current_price = current_price.fillna(df['avg_cost']).fillna(0)
+        
+        # Calculate cost basis for remaining shares
+        bought_qty = df['bought_qty'].fillna(0).astype(float)
+        current_holding = df['current_holding']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cost_basis = pd.Series(np.where(bought_qty > 0, df['total_invested'] * (current_holding / bought_qty), 0),
+                                   index=df.index)
+        market_value = current_holding * current_price
+        
+        # Convert to TWD with one rate lookup per distinct currency
+        cost_basis_twd = self.vectorized_to_twd(cost_basis, df['currency'])
+        market_value_twd = self.vectorized_to_twd(market_value, df['currency'])
+        unrealized_pnl_twd = market_value_twd - cost_basis_twd
+        
+        # Add detailed holding information
+        details = pd.DataFrame({
+            'symbol': df['symbol'],
+            'broker': df['broker'],
+            'shares': current_holding,
+            'avg_cost': df['avg_cost'],
+            'current_price': current_price,
+            'cost_basis': cost_basis,
+            'market_value': market_value,
+            'unrealized_pnl': unrealized_pnl_twd,
+            'currency': df['currency']
+        })
+        holdings_details = details.astype(object).where(details.notna(), None).to_dict('records')
         
         return {
-            'unrealized_pnl': total_unrealized_pnl_twd,
-            'total_market_value': total_market_value_twd,
-            'total_cost_basis': total_cost_basis_twd,
+            'unrealized_pnl': float(unrealized_pnl_twd.sum()),
+            'total_market_value': float(market_value_twd.sum()),
+            'total_cost_basis': float(cost_basis_twd.sum()),
             'holdings_count': len(holdings),
-            'total_shares': total_shares,
+            'total_shares': current_holding.sum().item(),
             'holdings_details': holdings_details,
             'price_fetch_errors': price_fetch_errors
         }
 
     def calculate_enhanced_unrealized_pnl(self, filters=None, base_currency='TWD'):
         """Calculate unrealized P&L with enhanced forex conversion and comprehensive symbol mapping"""
+        # Only changes with ingests (which change the data version) or price moves, so reuse it for the stock price TTL
+        key = (self.db_path, data_version(self.db_path), json.dumps(filters or {}, sort_keys=True, default=str),
+               base_currency)
+        result = _unrealized_pnl_cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = self._compute_enhanced_unrealized_pnl(filters, base_currency)
+            _unrealized_pnl_cache[key] = result
+        # Callers only serialize it or set top-level keys, so a shallow copy keeps the cached result intact
+        return dict(result)
+    
+    def _compute_enhanced_unrealized_pnl(self, filters=None, base_currency='TWD'):
+        """Compute the enhanced unrealized P&L behind calculate_enhanced_unrealized_pnl"""
         holdings = self._get_current_holdings(filters)
         
         if not holdings:
@@ -1609,70 +1970,62 @@ class PortfolioAPI:
         # Get current prices using enhanced method
         current_prices, price_errors = self._get_current_prices_enhanced(symbols_with_brokers)
         
+        # Snapshot one base-currency rate per holding currency up front instead of per holding,
+        # fetched concurrently together with the USD/TWD rate reported back to the client
+        holding_currencies = [holding[7] or 'TWD' for holding in holdings]
+        rates = self.bulk_get_rates([('USD', 'TWD')] + [(currency, base_currency) for currency in holding_currencies])
+        rate_by_currency = {from_currency: rate for (from_currency, to_currency), rate in rates.items()
+                            if to_currency == base_currency}
+        
         # Get current forex rates
         forex_rates = {
-            'USDTWD': self.get_forex_rate('USD', 'TWD')
+            'USDTWD': rates[('USD', 'TWD')]
         }
         
-        total_unrealized_pnl = 0
-        total_market_value = 0
-        total_cost_basis = 0
-        total_shares = 0
-        detailed_holdings = []
-        
-        for holding in holdings:
-            symbol, broker, bought_qty, sold_qty, current_holding, avg_cost, total_invested, currency = holding
-            
-            # Get current price
-            current_price = current_prices.get(symbol)
-            yahoo_symbol = self._get_yahoo_symbol(symbol, broker)
-            
-            if current_price is None:
-                # Fallback to average cost
-                current_price = avg_cost or 0
-            
-            # Calculate cost basis for remaining shares
-            cost_basis = (total_invested * (current_holding / bought_qty)) if bought_qty > 0 else 0
-            market_value = current_holding * current_price
-            
-            # Convert to base currency
-            if base_currency == 'TWD':
-                market_value_base = self.convert_to_twd(market_value, currency or 'TWD')
-                cost_basis_base = self.convert_to_twd(cost_basis, currency or 'TWD')
-            else:
-                # Use the generic forex conversion for other currencies
-                rate = self.get_forex_rate(currency or 'TWD', base_currency)
-                market_value_base = market_value * rate
-                cost_basis_base = cost_basis * rate
-            unrealized_pnl_base = market_value_base - cost_basis_base
-            
-            total_unrealized_pnl += unrealized_pnl_base
-            total_market_value += market_value_base
-            total_cost_basis += cost_basis_base
-            total_shares += current_holding
-            
-            # Add detailed holding information
-            detailed_holdings.append({
-                'symbol': symbol,
-                'broker': broker,
-                'currency': currency,
-                'current_holding': current_holding,
-                'current_price': current_price,
-                'market_value': market_value,
-                'market_value_base': market_value_base,
-                'cost_basis': cost_basis,
-                'cost_basis_base': cost_basis_base,
-                'unrealized_pnl_base': unrealized_pnl_base,
-                'yahoo_symbol': yahoo_symbol,
-                'avg_cost': avg_cost
-            })
+        # One column per holdings field, so the per-holding math runs as whole-array operations
+        df = pd.DataFrame(holdings, columns=['symbol', 'broker', 'bought_qty', 'sold_qty', 'current_holding',
+                                             'avg_cost', 'total_invested', 'currency'])
+        
+        # Fallback to average cost when no price was fetched
+        current_price = df['symbol'].map(current_prices).fillna(df['avg_cost']).fillna(0)
+        
+        # Calculate cost basis for remaining shares
+        bought_qty = df['bought_qty'].fillna(0).astype(float)
+        current_holding = df['current_holding']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cost_basis = pd.Series(np.where(bought_qty > 0, df['total_invested'] * (current_holding / bought_qty), 0),
+                                   index=df.index)
+        market_value = current_holding * current_price
+        
+        # Convert to base currency
+        rate = df['currency'].fillna('TWD').map(rate_by_currency)
+        market_value_base = market_value * rate
+        cost_basis_base = cost_basis * rate
+        unrealized_pnl_base = market_value_base - cost_basis_base
+        
+        # Add detailed holding information
+        details = pd.DataFrame({
+            'symbol': df['symbol'],
+            'broker': df['broker'],
+            'currency': df['currency'],
+            'current_holding': current_holding,
+            'current_price': current_price,
+            'market_value': market_value,
+            'market_value_base': market_value_base,
+            'cost_basis': cost_basis,
+            'cost_basis_base': cost_basis_base,
+            'unrealized_pnl_base': unrealized_pnl_base,
+            'yahoo_symbol': [self._get_yahoo_symbol(symbol, broker) for symbol, broker in symbols_with_brokers],
+            'avg_cost': df['avg_cost']
+        })
+        detailed_holdings = details.astype(object).where(details.notna(), None).to_dict('records')
         
         return {
-            'unrealized_pnl': total_unrealized_pnl,
-            'total_market_value': total_market_value,
-            'total_cost_basis': total_cost_basis,
+            'unrealized_pnl': float(unrealized_pnl_base.sum()),
+            'total_market_value': float(market_value_base.sum()),
+            'total_cost_basis': float(cost_basis_base.sum()),
             'holdings_count': len(holdings),
-            'total_shares': total_shares,
+            'total_shares': current_holding.sum().item(),
             'holdings_details': detailed_holdings,
             'price_fetch_errors': price_errors,
             'forex_rates_used': forex_rates,
@@ -1681,13 +2034,6 @@ class PortfolioAPI:
 
     def get_portfolio_performance_analysis(self, filters=None):
         """Get portfolio performance analysis distinguishing between cash flow and investment performance"""
-        # Broker mapping for filtering
-        broker_mapping = {
-            '國泰證券': 'CATHAY',
-            'Charles Schwab': 'SCHWAB', 
-            'TD Ameritrade': 'TDA'
-        }
-        
         # Base query for position analysis
         positions_query = """
             SELECT 
@@ -1717,71 +2063,62 @@ class PortfolioAPI:
             WHERE 1=1
         """
         
-        # Apply filters
-        params_positions = []
-        params_cash_flow = []
-        if filters:
-            # Handle multi-select broker filter
-            if filters.get('broker'):
-                broker_filter = filters['broker']
-                if isinstance(broker_filter, list) and len(broker_filter) > 0:
-                    short_names = [broker_mapping.get(broker, broker) for broker in broker_filter]
-                    placeholders = ','.join(['?' for _ in short_names])
-                    positions_query += f" AND t.broker IN ({placeholders})"
-                    cash_flow_query += f" AND t.broker IN ({placeholders})"
-                    params_positions.extend(short_names)
-                    params_cash_flow.extend(short_names)
-                elif isinstance(broker_filter, str):
-                    short_name = broker_mapping.get(broker_filter, broker_filter)
-                    positions_query += " AND t.broker = ?"
-                    cash_flow_query += " AND t.broker = ?"
-                    params_positions.append(short_name)
-                    params_cash_flow.append(short_name)
-        
-        positions_query += " GROUP BY t.symbol, t.broker ORDER BY t.symbol"
+        # Apply the broker filter, built once and shared by both queries
+        broker_sql, broker_params = self._build_tx_filter(filters, include_date=False, include_symbol=False, include_type=False)
+        broker_sql = (' AND ' + broker_sql) if broker_sql else ''
+        positions_query += broker_sql
+        cash_flow_query += broker_sql
         
-        with self.get_connection() as conn:
+        # No ORDER BY: the aggregated positions are sorted in Python once they are summarized
+        positions_query += " GROUP BY t.symbol, t.broker"
+        
+        # Per-position metrics computed by SQLite over the grouped rows (* 1.0 keeps integer quantities
+        # from truncating); a position with no buys realizes its whole sale proceeds
+        positions_query = f"""
+            SELECT 
+                symbol,
+                broker,
+                total_bought,
+                total_sold,
+                total_bought - total_sold as remaining_shares,
+                total_invested,
+                total_received,
+                CASE WHEN total_bought > 0 THEN total_invested * ((total_bought - total_sold) * 1.0 / total_bought)
+                     ELSE 0 END as current_position_cost,
+                total_received - CASE WHEN total_bought > 0 THEN total_invested * (total_sold * 1.0 / total_bought)
+                                      ELSE 0 END as realized_gain_loss,
+                COALESCE(avg_buy_price, 0) as avg_buy_price,
+                COALESCE(avg_sell_price, 0) as avg_sell_price
+            FROM ({positions_query}) positions
+        """
+        
+        # The cash flow scan is independent of the positions one, so it runs on a second pooled
+        # connection (WAL lets readers proceed side by side) while the positions are streamed here
+        with ThreadPoolExecutor(max_workers=1) as executor, self.get_connection() as conn:
+            cash_flow_future = executor.submit(self._query_one, cash_flow_query, broker_params)
             cursor = conn.cursor()
             
             # Get position analysis
-            cursor.execute(positions_query, params_positions)
-            positions_data = cursor.fetchall()
-            
-            # Get cash flow summary  
-            cursor.execute(cash_flow_query, params_cash_flow)
-            cash_flow_data = cursor.fetchone()
+            cursor.arraysize = 2048
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(positions_query, broker_params)
             
-            # Process positions
+            # Process positions in bounded batches instead of materializing the whole result
             positions_summary = []
             total_current_positions_cost = 0
             total_realized_gain_loss = 0
             
-            for row in positions_data:
-                symbol, broker, bought, sold, invested, received, avg_buy, avg_sell = row
+            for row in iter_batches(cursor):
+                total_current_positions_cost += row['current_position_cost']
+                total_realized_gain_loss += row['realized_gain_loss']
                 
-                remaining_shares = bought - sold
-                realized_gain_loss = received - (invested * (sold / bought) if bought > 0 else 0)
-                current_position_cost = invested * (remaining_shares / bought) if bought > 0 else 0
-                
-                total_current_positions_cost += current_position_cost
-                total_realized_gain_loss += realized_gain_loss
-                
-                if remaining_shares > 0 or realized_gain_loss != 0:
-                    positions_summary.append({
-                        'symbol': symbol,
-                        'broker': broker,
-                        'total_bought': bought,
-                        'total_sold': sold,
-                        'remaining_shares': remaining_shares,
-                        'total_invested': invested,
-                        'total_received': received,
-                        'current_position_cost': current_position_cost,
-                        'realized_gain_loss': realized_gain_loss,
-                        'avg_buy_price': avg_buy or 0,
-                        'avg_sell_price': avg_sell or 0
-                    })
+                if row['remaining_shares'] > 0 or row['realized_gain_loss'] != 0:
+                    positions_summary.append(dict(row))
+            
+            positions_summary.sort(key=lambda position: position['symbol'])
             
             # Process cash flow data
+            cash_flow_data = cash_flow_future.result()
             (sales_proceeds, purchase_cost, dividends, deposits, withdrawals, fees, taxes) = cash_flow_data or (0, 0, 0, 0, 0, 0, 0)
             
             # Calculate different metrics
@@ -1810,7 +2147,7 @@ class PortfolioAPI:
                 },
                 'current_positions': positions_summary,
                 'summary': {
-                    'total_positions': len([p for p in positions_summary if p['remaining_shares'] > 0]),
+                    'total_positions': sum(1 for p in positions_summary if p['remaining_shares'] > 0),
                     'total_symbols_traded': len(positions_summary),
                     'explanation': {
                         'net_cash_flow_vs_portfolio_performance': {
@@ -1842,15 +2179,12 @@ class PortfolioAPI:
         """
         
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            results = []
-            for row in cursor.fetchall():
-                data = dict(zip([col[0] for col in cursor.description], row))
-                data['realized_gain_loss'] = (data['sales'] or 0) - (data['purchases'] or 0)
-                data['net_after_fees'] = data['realized_gain_loss'] - (data['fees'] or 0) - (data['taxes'] or 0)
-                results.append(data)
-            return results
+            df = pd.read_sql_query(query, conn)
+        
+        # Derived columns computed over whole columns; NULL sums count as 0 here but stay null in the output
+        df['realized_gain_loss'] = df['sales'].fillna(0) - df['purchases'].fillna(0)
+        df['net_after_fees'] = df['realized_gain_loss'] - df['fees'].fillna(0) - df['taxes'].fillna(0)
+        return df.astype(object).where(df.notna(), None).to_dict('records')
     
     def get_data_freshness_status(self):
         """Get data freshness status for all brokers"""
@@ -1878,6 +2212,82 @@ portfolio_api = PortfolioAPI()
 
 
 
+def gzip_stream(chunks, level=COMPRESS_LEVEL):
+    """Gzip an iterable of byte chunks incrementally, for streamed responses"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.after_request
+def compress_response(response):
+    """Gzip JSON responses (including streamed ones) for clients that accept it"""
+    if (response.mimetype != 'application/json' or response.status_code != 200
+            or 'Content-Encoding' in response.headers or not request.accept_encodings['gzip']):
+        return response
+    
+    if response.is_streamed:
+        response.response = gzip_stream(response.iter_encoded())
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(gzip.compress(data, COMPRESS_LEVEL))
+    
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    # The ETag was computed over the uncompressed body, so it only identifies this representation weakly
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def revalidated_json(payload):
+    """jsonify with an ETag so an unchanged payload is answered with a body-less 304"""
+    response = jsonify(payload)
+    response.add_etag()
+    # Clients revalidate every time, so a fresh ingest is visible immediately
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def versioned_etag(ttl, *inputs):
+    """ETag of a cached computation from the data version, its inputs and the current ttl window,
+    known before the computation runs"""
+    version = (data_version(portfolio_api.db_path), int(time.time() // ttl)) + inputs
+    return hashlib.sha1(json.dumps(version, sort_keys=True, default=str).encode()).hexdigest()
+
+def conditional_json(etag, compute):
+    """Answer a matching If-None-Match with a body-less 304 without running compute(), else jsonify its result"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(compute())
+    # Derived from the inputs rather than the body bytes, so weak; the 200 and the 304 then carry the same ETag
+    response.set_etag(etag, weak=True)
+    # Clients revalidate every time, so a fresh ingest is visible immediately
+    response.cache_control.no_cache = True
+    return response
+
+def extract_filters(multi=(), single=(), integer=()):
+    """Collect the non-empty query-string filters a route accepts (multi-select keys as lists)"""
+    filters = {}
+    for key in multi:
+        values = [value for value in request.args.getlist(key) if value]
+        if values:
+            filters[key] = values
+    for key in single:
+        value = request.args.get(key)
+        if value:
+            filters[key] = value
+    for key in integer:
+        # Missing or non-numeric values are None; 0 is a real value (e.g. limit=0)
+        value = request.args.get(key, type=int)
+        if value is not None:
+            filters[key] = value
+    return filters
+
 @app.route('/')
 def index():
     """Main dashboard page"""
@@ -1888,79 +2298,86 @@ def index():
 def api_accounts():
     """Get all accounts"""
     accounts = portfolio_api.get_accounts()
-    return jsonify(accounts)
+    return revalidated_json(accounts)
 
 @app.route('/api/brokers')
 def api_brokers():
     """Get all brokers with account separation"""
     broker_data = portfolio_api.get_brokers()
     # Return both broker names and keys for frontend processing
-    return jsonify(broker_data)
+    return revalidated_json(broker_data)
 
 @app.route('/api/users')
 def api_users():
     """Get all users"""
     users = portfolio_api.get_users()
-    return jsonify(users)
+    return revalidated_json(users)
 
 @app.route('/api/symbols')
 def api_symbols():
     """Get all symbols, optionally filtered by broker"""
-    broker_filters = request.args.getlist('broker')  # Support multiple brokers
-    # Remove empty values
-    broker_filters = [b for b in broker_filters if b]
-    
-    if not broker_filters:
-        broker_filters = None
-        
+    broker_filters = extract_filters(multi=('broker',)).get('broker')  # Support multiple brokers
     symbols = portfolio_api.get_symbols(broker_filters)
-    return jsonify(symbols)
+    return revalidated_json(symbols)
 
 @app.route('/api/currencies')
 def api_currencies():
     """Get all currencies"""
     currencies = portfolio_api.get_currencies()
-    return jsonify(currencies)
+    return revalidated_json(currencies)
 
 @app.route('/api/transactions')
 def api_transactions():
     """Get filtered transactions"""
-    filters = {
-        'account_id': request.args.get('account_id'),
-        'institution': request.args.get('institution'),
-        'broker': request.args.getlist('broker'),  # Support multiple brokers
-        'symbol': request.args.getlist('symbol'),  # Support multiple symbols
-        'transaction_type': request.args.getlist('transaction_type'),  # Support multiple transaction types
-        'user': request.args.getlist('user'),  # Support multiple users
-        'start_date': request.args.get('start_date'),
-        'end_date': request.args.get('end_date'),
-        'year': request.args.get('year'),
-        'currency': request.args.get('currency'),
-    }
+    filters = extract_filters(
+        multi=('broker', 'symbol', 'transaction_type', 'user'),
+        single=('account_id', 'institution', 'start_date', 'end_date', 'currency'),
+        integer=('year', 'limit', 'offset')  # Optional pagination; a non-numeric year is dropped
+    )
     
-    # Remove None values and empty lists
-    filters = {k: v for k, v in filters.items() if v and (not isinstance(v, list) or len(v) > 0)}
+    # Opt-in {"columns": [...], "rows": [[...], ...]} layout that sends each key once instead of per row
+    columnar = request.args.get('format') == 'columnar'
     
-    transactions = portfolio_api.get_transactions(filters)
-    return jsonify(transactions)
+    transactions = portfolio_api.iter_transactions(filters)
+    # Run the query now, so a bad filter still fails with a 500 instead of a truncated 200
+    first = next(transactions, None)
+    if first is None:
+        return jsonify({'columns': [], 'rows': []} if columnar else [])
+    
+    # Serialized with the app's JSON provider (same compact output as jsonify)
+    def dumps(value):
+        return app.json.dumps(value, separators=(',', ':'))
+    
+    if columnar:
+        # Every row has the same keys in the same order, taken from the first one
+        head, tail = '{"columns":' + dumps(list(first)) + ',"rows":[', ']}\n'
+        encode = lambda transaction: dumps(list(transaction.values()))
+    else:
+        head, tail, encode = '[', ']\n', dumps
+    
+    def generate():
+        # One chunk per batch of rows
+        chunk = [head, encode(first)]
+        for transaction in transactions:
+            chunk.append(',')
+            chunk.append(encode(transaction))
+            if len(chunk) >= 2 * TRANSACTION_STREAM_BATCH:
+                yield ''.join(chunk)
+                chunk = []
+        chunk.append(tail)
+        yield ''.join(chunk)
+    
+    return Response(stream_with_context(generate()), mimetype=app.json.mimetype)
 
 @app.route('/api/summary')
 def api_summary():
     """Get portfolio summary"""
-    filters = {
-        'broker': request.args.getlist('broker'),  # Support multiple brokers
-        'symbol': request.args.getlist('symbol'),  # Support multiple symbols  
-        'transaction_type': request.args.getlist('transaction_type'),  # Support multiple transaction types
-        'year': request.args.get('year'),
-        'start_date': request.args.get('start_date'),
-        'end_date': request.args.get('end_date'),
-    }
+    filters = extract_filters(multi=('broker', 'symbol', 'transaction_type'),
+                              single=('start_date', 'end_date'), integer=('year',))
     
-    # Remove None values and empty lists
-    filters = {k: v for k, v in filters.items() if v and (not isinstance(v, list) or len(v) > 0)}
-    
-    summary = portfolio_api.get_portfolio_summary(filters)
-    return jsonify(summary)
+    # Summaries also depend on forex rates, so the ETag rolls over with the summary cache TTL
+    etag = versioned_etag(CACHE_TTL_SUMMARY, 'summary', filters)
+    return conditional_json(etag, lambda: portfolio_api.get_portfolio_summary(filters))
 
 @app.route('/api/performance')
 def api_performance():
@@ -1985,28 +2402,27 @@ def api_load_csv():
 def process_all_statements():
     """Process all broker statements (PDF and CSV)"""
     try:
-        api = PortfolioAPI()
-        success = api.process_all_broker_statements()
+        success = portfolio_api.process_all_broker_statements()
         
         if success:
             # Get processing summary
-            with sqlite3.connect(api.db_path) as conn:
+            with portfolio_api.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Get broker counts
-                cursor.execute("SELECT broker, COUNT(*) FROM accounts GROUP BY broker")
-                broker_counts = dict(cursor.fetchall())
-                
-                # Get transaction counts
-                cursor.execute("SELECT broker, COUNT(*) FROM transactions GROUP BY broker")
-                transaction_counts = dict(cursor.fetchall())
-                
-                # Get total counts
-                cursor.execute("SELECT COUNT(*) FROM accounts")
-                total_accounts = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM transactions")
-                total_transactions = cursor.fetchone()[0]
+                # Totals plus per-broker account/transaction counts in one statement; the per-broker
+                # maps come back as JSON objects (a NULL broker is keyed "null", as json.dumps would)
+                cursor.execute("""
+                    SELECT
+                        (SELECT COUNT(*) FROM accounts),
+                        (SELECT COUNT(*) FROM transactions),
+                        (SELECT json_group_object(COALESCE(broker, 'null'), n)
+                         FROM (SELECT broker, COUNT(*) AS n FROM accounts GROUP BY broker)),
+                        (SELECT json_group_object(COALESCE(broker, 'null'), n)
+                         FROM (SELECT broker, COUNT(*) AS n FROM transactions GROUP BY broker))
+                """)
+                total_accounts, total_transactions, broker_counts, transaction_counts = cursor.fetchone()
+                broker_counts = json.loads(broker_counts)
+                transaction_counts = json.loads(transaction_counts)
                 
                 return jsonify({
                     'success': True,
@@ -2036,42 +2452,12 @@ def process_all_statements():
 def broker_summary():
     """Get summary by broker"""
     try:
-        api = PortfolioAPI()
+        broker_summary = portfolio_api.get_broker_summary()
         
-        with sqlite3.connect(api.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Get account summary by broker
-            cursor.execute("""
-                SELECT a.broker, a.institution, COUNT(DISTINCT a.account_id) as account_count,
-                       COUNT(DISTINCT t.id) as transaction_count,
-                       SUM(CASE WHEN t.transaction_type LIKE '%買%' OR t.transaction_type LIKE '%Buy%' THEN 1 ELSE 0 END) as buy_count,
-                       SUM(CASE WHEN t.transaction_type LIKE '%賣%' OR t.transaction_type LIKE '%Sell%' THEN 1 ELSE 0 END) as sell_count,
-                       SUM(t.net_amount) as total_net_amount
-                FROM accounts a
-                LEFT JOIN transactions t ON a.account_id = t.account_id
-                GROUP BY a.broker, a.institution
-                ORDER BY a.broker
-            """)
-            
-            broker_summary = []
-            for row in cursor.fetchall():
-                broker_summary.append({
-                    'broker': row[0],
-                    'institution': row[1],
-                    'account_count': row[2],
-                    'transaction_count': row[3],
-                    'buy_transactions': row[4],
-                    'sell_transactions': row[5],
-                    'total_net_cash_flow': row[6] or 0,  # Clarified name
-                    'net_amount_explanation': 'This represents net cash flow (money in/out), not portfolio performance. Negative values indicate more money spent on purchases than received from sales.'
-                })
-            
-            return jsonify({
-                'success': True,
-                'broker_summary': broker_summary
-            })
-            
+        return jsonify({
+            'success': True,
+            'broker_summary': broker_summary
+        })
     except Exception as e:
         return jsonify({
             'success': False,
@@ -2088,8 +2474,7 @@ def portfolio_performance():
             if isinstance(value, list) and len(value) == 1:
                 filters[key] = value[0]
         
-        api = PortfolioAPI()
-        analysis = api.get_portfolio_performance_analysis(filters)
+        analysis = portfolio_api.get_portfolio_performance_analysis(filters)
         
         return jsonify({
             'success': True,
@@ -2137,17 +2522,14 @@ def api_unrealized_pnl():
     """Calculate unrealized P&L for current holdings"""
     try:
         # Get filters from request parameters
-        filters = {}
-        if request.args.get('broker'):
-            broker_list = request.args.getlist('broker')
-            filters['broker'] = broker_list if len(broker_list) > 1 else broker_list[0] if broker_list else None
+        filters = extract_filters(multi=('broker',))
         
-        print(f"Debug - unrealized-pnl filters: {filters}")
+        logger.debug("unrealized-pnl filters: %s", filters)
         result = portfolio_api.calculate_unrealized_pnl(filters)
-        print(f"Debug - unrealized-pnl result: {result}")
+        logger.debug("unrealized-pnl result: %s", result)
         return jsonify(result)
     except Exception as e:
-        print(f"Debug - unrealized-pnl error: {e}")
+        logger.error("unrealized-pnl error: %s", e)
         return jsonify({
             'error': str(e),
             'unrealized_pnl': 0,
@@ -2162,20 +2544,25 @@ def api_unrealized_pnl_enhanced():
     """Calculate enhanced unrealized P&L with comprehensive forex and symbol mapping"""
     try:
         # Get filters from request parameters
-        filters = {}
-        if request.args.get('broker'):
-            broker_list = request.args.getlist('broker')
-            filters['broker'] = broker_list if len(broker_list) > 1 else broker_list[0] if broker_list else None
+        filters = extract_filters(multi=('broker',))
         
         # Get base currency (default to TWD)
         base_currency = request.args.get('base_currency', 'TWD')
         
-        print(f"Debug - enhanced unrealized-pnl filters: {filters}, base_currency: {base_currency}")
-        result = portfolio_api.calculate_enhanced_unrealized_pnl(filters, base_currency)
-        print(f"Debug - enhanced unrealized-pnl result summary: unrealized_pnl={result.get('unrealized_pnl')}, errors={len(result.get('price_fetch_errors', []))}")
-        return jsonify(result)
+        logger.debug("enhanced unrealized-pnl filters: %s, base_currency: %s", filters, base_currency)
+        
+        def compute():
+            result = portfolio_api.calculate_enhanced_unrealized_pnl(filters, base_currency)
+            logger.debug("enhanced unrealized-pnl result summary: unrealized_pnl=%s, errors=%d",
+                         result.get('unrealized_pnl'), len(result.get('price_fetch_errors', [])))
+            return result
+        
+        # Dashboard polls within one price TTL window of unchanged data get a 304 without recomputing;
+        # prices move, so the ETag rolls over with the P&L cache TTL
+        etag = versioned_etag(CACHE_TTL_STOCK, 'unrealized_pnl_enhanced', filters, base_currency)
+        return conditional_json(etag, compute)
     except Exception as e:
-        print(f"Debug - enhanced unrealized-pnl error: {e}")
+        logger.error("enhanced unrealized-pnl error: %s", e)
         return jsonify({
             'error': str(e),
             'unrealized_pnl': 0,
@@ -2191,28 +2578,21 @@ def api_unrealized_pnl_enhanced():
 def api_system_status():
     """Get system status including Yahoo Finance availability"""
     try:
-        api = PortfolioAPI()
-        
         # Check Yahoo Finance availability
-        yahoo_available = api._check_yahoo_finance_availability()
+        yahoo_available = portfolio_api._check_yahoo_finance_availability()
         
         # Get cache status
-        cache_valid = api._is_cache_valid()
         cache_info = {
-            'valid': cache_valid,
-            'timestamp': api._cache_timestamp,
-            'duration': api._cache_duration,
-            'forex_entries': len(api._forex_cache),
-            'stock_price_entries': len(api._stock_price_cache)
+            'forex_ttl': portfolio_api._forex_cache.ttl,
+            'stock_price_ttl': portfolio_api._stock_price_cache.ttl,
+            'forex_entries': len(portfolio_api._forex_cache),
+            'stock_price_entries': len(portfolio_api._stock_price_cache),
+            'price_miss_ttl': portfolio_api._price_miss_cache.ttl,
+            'price_miss_entries': len(portfolio_api._price_miss_cache)
         }
         
         # Get request throttling info
-        throttling_info = {
-            'request_count': api._request_count,
-            'last_request_time': api._last_request_time,
-            'yahoo_finance_available': api._yahoo_finance_available,
-            'last_yahoo_check': api._last_yahoo_check
-        }
+        throttling_info = portfolio_api._rate_limiter.status()
         
         return jsonify({
             'success': True,
@@ -2228,25 +2608,25 @@ def api_system_status():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+def get_common_forex_rates():
+    """Get the commonly used forex rates in one concurrent fetch"""
+    fetched = portfolio_api.bulk_get_rates([('USD', 'TWD'), ('TWD', 'USD')])
+    return {
+        'USDTWD': fetched[('USD', 'TWD')],
+        'TWDUSD': fetched[('TWD', 'USD')]
+    }
+
 @app.route('/api/forex-rates')
 def api_forex_rates():
     """Get current forex rates"""
     try:
-        api = PortfolioAPI()
-        
-        # Get commonly used forex rates
-        rates = {
-            'USDTWD': api.get_forex_rate('USD', 'TWD'),
-            'TWDUSD': api.get_forex_rate('TWD', 'USD')
-        }
-        
         return jsonify({
-            'rates': rates,
+            'rates': get_common_forex_rates(),
             'timestamp': datetime.now().isoformat(),
             'base_currency': 'Multiple'
         })
     except Exception as e:
-        print(f"Debug - forex-rates error: {e}")
+        logger.error("forex-rates error: %s", e)
         return jsonify({
             'error': str(e),
             'rates': {},
@@ -2257,15 +2637,13 @@ def api_forex_rates():
 def api_symbol_mapping():
     """Get symbol mapping information for debugging"""
     try:
-        api = PortfolioAPI()
-        
         # Get test symbol mappings
         test_symbols = ['台積電', '2330', 'AAPL', '聯發科', '2454']
         mappings = {}
         
         for symbol in test_symbols:
-            yahoo_symbol = api._get_yahoo_symbol(symbol, None)
-            yahoo_symbol_with_broker = api._get_yahoo_symbol(symbol, 'CATHAY')
+            yahoo_symbol = portfolio_api._get_yahoo_symbol(symbol, None)
+            yahoo_symbol_with_broker = portfolio_api._get_yahoo_symbol(symbol, 'CATHAY')
             mappings[symbol] = {
                 'yahoo_symbol': yahoo_symbol,
                 'yahoo_symbol_with_cathay': yahoo_symbol_with_broker
@@ -2276,12 +2654,128 @@ def api_symbol_mapping():
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
-        print(f"Debug - symbol-mapping error: {e}")
+        logger.error("symbol-mapping error: %s", e)
         return jsonify({
             'error': str(e),
             'mappings': {}
         }), 500
 
+# Bulk sub-request arguments that must be integers or single strings; every other filter is a string or a list of strings
+BULK_INTEGER_ARGS = frozenset(('limit', 'offset', 'year'))
+BULK_STRING_ARGS = frozenset(('base_currency',))
+
+class BulkArgumentError(ValueError):
+    """A bulk sub-request argument of the wrong type, reported as a 400 for that call"""
+
+def _bulk_input(result):
+    """Turn another bulk call's result into an argument value: lookup tuples become lists, and the
+    get_brokers mapping becomes its list of broker filter keys"""
+    if isinstance(result, dict) and isinstance(result.get('broker_keys'), dict):
+        return list(result['broker_keys'].values())
+    if isinstance(result, tuple):
+        return list(result)
+    return result
+
+def _bulk_filters(args, keys):
+    """Keep the non-empty filter values a bulk sub-request passed for the given keys, checking their types"""
+    filters = {}
+    for key in keys:
+        value = args.get(key)
+        if isinstance(value, tuple):
+            value = list(value)
+        if value is None or value == '' or value == []:
+            continue
+        # Values spliced in through input_from can be any other call's result (dicts, lists of dicts, ...)
+        if key in BULK_INTEGER_ARGS:
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise BulkArgumentError(f'"{key}" must be an integer')
+        elif key in BULK_STRING_ARGS:
+            if not isinstance(value, str):
+                raise BulkArgumentError(f'"{key}" must be a string')
+        elif not isinstance(value, str) and not (
+                isinstance(value, list) and all(isinstance(item, str) for item in value)):
+            raise BulkArgumentError(f'"{key}" must be a string or a list of strings')
+        filters[key] = value
+    return filters
+
+# Bulk sub-request name -> handler taking the sub-request args; each mirrors its single-resource route
+BULK_HANDLERS = {
+    'accounts': lambda args: portfolio_api.get_accounts(),
+    'brokers': lambda args: portfolio_api.get_brokers(),
+    'users': lambda args: portfolio_api.get_users(),
+    'currencies': lambda args: portfolio_api.get_currencies(),
+    'symbols': lambda args: portfolio_api.get_symbols(_bulk_filters(args, ['broker']).get('broker')),
+    'transactions': lambda args: portfolio_api.get_transactions(_bulk_filters(args, [
+        'account_id', 'institution', 'broker', 'symbol', 'transaction_type', 'user',
+        'start_date', 'end_date', 'year', 'currency', 'limit', 'offset'])),
+    'summary': lambda args: portfolio_api.get_portfolio_summary(_bulk_filters(args, [
+        'broker', 'symbol', 'transaction_type', 'year', 'start_date', 'end_date'])),
+    'performance': lambda args: portfolio_api.get_performance_by_year(),
+    'unrealized_pnl': lambda args: portfolio_api.calculate_unrealized_pnl(_bulk_filters(args, ['broker'])),
+    'unrealized_pnl_enhanced': lambda args: portfolio_api.calculate_enhanced_unrealized_pnl(
+        _bulk_filters(args, ['broker']), _bulk_filters(args, ['base_currency']).get('base_currency', 'TWD')),
+    'forex_rates': lambda args: get_common_forex_rates(),
+    'data_freshness': lambda args: portfolio_api.get_data_freshness_status(),
+}
+BULK_MAX_CALLS = 32
+
+@app.route('/api/bulk', methods=['POST'])
+def api_bulk():
+    """Run several read-only API calls in one roundtrip.
+    Body: {"calls": [{"id": ..., "path": <BULK_HANDLERS key>, "args": {...}, "input_from": {arg: id}}]}"""
+    payload = request.get_json(silent=True) or {}
+    calls = payload.get('calls')
+    if not isinstance(calls, list) or not calls:
+        return jsonify({'error': 'Expected a non-empty "calls" list'}), 400
+    if len(calls) > BULK_MAX_CALLS:
+        return jsonify({'error': f'At most {BULK_MAX_CALLS} calls per request'}), 400
+    
+    pending = {}
+    for position, call in enumerate(calls):
+        if not isinstance(call, dict) or call.get('path') not in BULK_HANDLERS:
+            return jsonify({'error': f'Unknown bulk call at position {position}'}), 400
+        if not isinstance(call.get('args') or {}, dict) or not isinstance(call.get('input_from') or {}, dict):
+            return jsonify({'error': f'"args" and "input_from" must be objects at position {position}'}), 400
+        input_from = call.get('input_from') or {}
+        if not all(isinstance(source_id, (str, int)) and not isinstance(source_id, bool)
+                   for source_id in input_from.values()):
+            return jsonify({'error': f'"input_from" values must be call ids at position {position}'}), 400
+        call_id = str(call.get('id') or call['path'])
+        if call_id in pending:
+            return jsonify({'error': f'Duplicate bulk call id: {call_id}'}), 400
+        # Source ids are compared as strings, like the call ids they refer to
+        pending[call_id] = dict(call, input_from={arg: str(source_id) for arg, source_id in input_from.items()})
+    
+    def run(item):
+        call_id, call = item
+        # input_from substitutes another call's result for an argument, e.g. {"broker": "brokers"}
+        args = dict(call.get('args') or {})
+        for arg, source_id in call['input_from'].items():
+            args[arg] = _bulk_input(results[source_id])
+        try:
+            return call_id, BULK_HANDLERS[call['path']](args)
+        except BulkArgumentError as e:
+            return call_id, {'error': str(e), 'status': 400}
+        except Exception as e:
+            logger.warning("Bulk call %s failed: %s", call_id, e)
+            return call_id, {'error': str(e)}
+    
+    # Independent calls run concurrently; calls fed by input_from wait for the wave that produces their input
+    results = {}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        while pending:
+            ready = [(call_id, call) for call_id, call in pending.items()
+                     if all(source_id in results for source_id in call['input_from'].values())]
+            if not ready:
+                for call_id in pending:
+                    results[call_id] = {'error': 'Unresolved input_from dependency'}
+                break
+            for call_id, _ in ready:
+                del pending[call_id]
+            results.update(executor.map(run, ready))
+    
+    return jsonify({'results': results})
+
 if __name__ == '__main__':
     # Ensure templates directory exists
     os.makedirs('templates', exist_ok=True)
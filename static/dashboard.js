@@ -284,18 +284,19 @@ class PortfolioDashboard {
     // Load filter options
     async loadFilterOptions() {
         try {
-            // Load users FIRST
-            const users = await this.fetchAPI('/api/users');
+            // Load users, brokers and symbols in one roundtrip
+            const { users, brokers: brokerData, symbols } = await this.fetchBulk([
+                { path: 'users' },
+                { path: 'brokers' },
+                { path: 'symbols' }
+            ]);
             this.populateSelect('userFilter', users);
             
-            // Load brokers and ensure broker keys are loaded before proceeding
-            const brokerData = await this.fetchAPI('/api/brokers');
+            // Ensure broker keys are loaded before proceeding
             this.brokerKeys = brokerData.broker_keys || {};
             console.log('Broker keys loaded:', this.brokerKeys);
             this.populateSelect('brokerFilter', brokerData.brokers || brokerData);
 
-            // Load symbols
-            const symbols = await this.fetchAPI('/api/symbols');
             this.populateSelect('symbolFilter', symbols);
 
             // Populate years (2017-2025)
@@ -1557,6 +1558,26 @@ class PortfolioDashboard {
         }
     }
 
+    // Run several API calls through /api/bulk; resolves to results keyed by call id (defaults to path)
+    async fetchBulk(calls) {
+        console.log('Fetching bulk:', calls.map(call => call.id || call.path));
+        const response = await fetch('/api/bulk', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ calls })
+        });
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const { results } = await response.json();
+        for (const [id, result] of Object.entries(results)) {
+            if (result && !Array.isArray(result) && result.error) {
+                throw new Error(`Bulk call ${id} failed: ${result.error}`);
+            }
+        }
+        return results;
+    }
+
     formatNumber(num) {
         if (num === null || num === undefined) return '0';
         return parseFloat(num).toLocaleString('en-US', { 
@@ -323,3 +323,155 @@ test.describe('Portfolio Data Validation', () => {
     expect(filteredRowCount).toBeGreaterThanOrEqual(0);
   });
 });
+
+test.describe('Portfolio API', () => {
+  test('should chain symbols into summary through bulk input_from', async ({ request }) => {
+    const response = await request.post('/api/bulk', {
+      data: {
+        calls: [
+          { id: 'symbols', path: 'symbols' },
+          { id: 'summary', path: 'summary', input_from: { symbol: 'symbols' } }
+        ]
+      }
+    });
+    expect(response.status()).toBe(200);
+    const { results } = await response.json();
+    
+    // The lookup result is passed on as the symbol filter
+    expect(Array.isArray(results.symbols)).toBeTruthy();
+    expect(results.summary.error).toBeUndefined();
+    
+    if (results.symbols.length > 0) {
+      const query = results.symbols.map(symbol => `symbol=${encodeURIComponent(symbol)}`).join('&');
+      const summary = await (await request.get(`/api/summary?${query}`)).json();
+      expect(results.summary).toEqual(summary);
+    }
+  });
+
+  test('should chain brokers into symbols through bulk input_from', async ({ request }) => {
+    const response = await request.post('/api/bulk', {
+      data: {
+        calls: [
+          { id: 'brokers', path: 'brokers' },
+          { id: 1, path: 'symbols', input_from: { broker: 'brokers' } }
+        ]
+      }
+    });
+    expect(response.status()).toBe(200);
+    const { results } = await response.json();
+    
+    // Broker filter keys are taken from the brokers result; integer call ids resolve as strings
+    expect(results.brokers.broker_keys).toBeTruthy();
+    expect(Array.isArray(results['1'])).toBeTruthy();
+    
+    const brokerKeys = Object.values(results.brokers.broker_keys);
+    if (brokerKeys.length > 0) {
+      const query = brokerKeys.map(key => `broker=${encodeURIComponent(key)}`).join('&');
+      const symbols = await (await request.get(`/api/symbols?${query}`)).json();
+      expect(results['1']).toEqual(symbols);
+    }
+  });
+
+  test('should reject unknown bulk paths', async ({ request }) => {
+    const response = await request.post('/api/bulk', {
+      data: { calls: [{ path: 'users' }, { path: 'does_not_exist' }] }
+    });
+    expect(response.status()).toBe(400);
+    expect((await response.json()).error).toContain('position 1');
+  });
+
+  test('should reject malformed bulk input_from', async ({ request }) => {
+    // A source id must be a call id
+    let response = await request.post('/api/bulk', {
+      data: { calls: [{ path: 'symbols', input_from: { broker: ['users'] } }] }
+    });
+    expect(response.status()).toBe(400);
+    
+    // A result that is not a usable filter value fails that call only
+    response = await request.post('/api/bulk', {
+      data: {
+        calls: [
+          { id: 'accounts', path: 'accounts' },
+          { id: 'symbols', path: 'symbols', input_from: { broker: 'accounts' } }
+        ]
+      }
+    });
+    expect(response.status()).toBe(200);
+    const { results } = await response.json();
+    expect(Array.isArray(results.accounts)).toBeTruthy();
+    if (results.accounts.length > 0) {
+      expect(results.symbols.status).toBe(400);
+    }
+    
+    // An unknown source id is reported instead of waited on
+    response = await request.post('/api/bulk', {
+      data: { calls: [{ id: 'summary', path: 'summary', input_from: { symbol: 'missing' } }] }
+    });
+    expect(response.status()).toBe(200);
+    expect((await response.json()).results.summary.error).toBe('Unresolved input_from dependency');
+  });
+
+  test('should serve columnar transactions matching the row-based output', async ({ request }) => {
+    const rows = await (await request.get('/api/transactions?limit=5')).json();
+    const response = await request.get('/api/transactions?limit=5&format=columnar');
+    expect(response.status()).toBe(200);
+    const columnar = await response.json();
+    
+    expect(Array.isArray(columnar.columns)).toBeTruthy();
+    expect(Array.isArray(columnar.rows)).toBeTruthy();
+    expect(columnar.rows.length).toBe(rows.length);
+    
+    // Every row lists its values in column order
+    columnar.rows.forEach((values, index) => {
+      expect(values.length).toBe(columnar.columns.length);
+      const row = Object.fromEntries(columnar.columns.map((column, i) => [column, values[i]]));
+      expect(row).toEqual(rows[index]);
+    });
+  });
+
+  test('should page streamed transactions with limit and offset', async ({ request }) => {
+    const all = await (await request.get('/api/transactions')).json();
+    const firstPage = await (await request.get('/api/transactions?limit=2&offset=0')).json();
+    const secondPage = await (await request.get('/api/transactions?limit=2&offset=2')).json();
+    
+    // Pages are consecutive slices of the unpaged output
+    expect(firstPage).toEqual(all.slice(0, 2));
+    expect(secondPage).toEqual(all.slice(2, 4));
+    
+    // limit=0 returns no rows rather than all of them
+    const empty = await (await request.get('/api/transactions?limit=0')).json();
+    expect(empty).toEqual([]);
+  });
+
+  test('should gzip JSON responses for clients that accept it', async ({ request }) => {
+    const response = await request.get('/api/transactions', { headers: { 'Accept-Encoding': 'gzip' } });
+    expect(response.status()).toBe(200);
+    const transactions = await response.json();
+    
+    // Streamed transactions are compressed whenever there is a body to stream
+    if (transactions.length > 0) {
+      expect(response.headers()['content-encoding']).toBe('gzip');
+      expect(response.headers()['vary']).toContain('Accept-Encoding');
+    }
+    
+    const identity = await request.get('/api/transactions', { headers: { 'Accept-Encoding': 'identity' } });
+    expect(identity.headers()['content-encoding']).toBeUndefined();
+  });
+
+  test('should answer a matching If-None-Match with 304', async ({ request }) => {
+    // Lookups ETag the payload; summary and unrealized P&L ETag the data version before computing
+    for (const path of ['/api/symbols', '/api/summary', '/api/unrealized-pnl-enhanced']) {
+      const headers = { 'Accept-Encoding': 'gzip' };
+      const response = await request.get(path, { headers });
+      expect(response.status()).toBe(200);
+      const etag = response.headers()['etag'];
+      expect(etag).toBeTruthy();
+      expect(response.headers()['cache-control']).toContain('no-cache');
+      
+      const revalidated = await request.get(path, { headers: { ...headers, 'If-None-Match': etag } });
+      expect(revalidated.status()).toBe(304);
+      expect(revalidated.headers()['etag']).toBe(etag);
+      expect((await revalidated.body()).length).toBe(0);
+    }
+  });
+});